@@ -1,28 +1,293 @@
 from __future__ import annotations
 
+import collections
+import glob
+import os
+import queue
+import threading
+import time
+
 import numpy as np
 import numpy.typing as npt
 import torch
 
+EOS_TOKEN_ID = 50256  # GPT-2 <|endoftext|>, appended after every document by cs336_data tokenize
+IGNORE_INDEX = -100  # target of padding in packed batches, ignored by F.cross_entropy
+SAMPLING_MODES = ("random", "doc_start", "packed")
+SCAN_CHUNK_TOKENS = 1 << 24
+
+
+def document_index(
+    path: str | os.PathLike, dtype: npt.DTypeLike = np.uint16, eos_token_id: int = EOS_TOKEN_ID
+) -> np.ndarray:
+    """
+    Start of every document of the token file at path, followed by its length:
+    document i is tokens[index[i]:index[i + 1]], including its EOS. The EOS scan
+    runs once, in chunks, and is cached in `<path>.docidx.<dtype>.eos<id>.npy`
+    until the token file changes.
+    """
+    cache_path = f"{os.fspath(path)}.docidx.{np.dtype(dtype).name}.eos{eos_token_id}.npy"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        return np.load(cache_path, mmap_mode="r")
+    tokens = np.memmap(path, dtype=dtype, mode="r")
+    ends = [
+        np.flatnonzero(tokens[start : start + SCAN_CHUNK_TOKENS] == eos_token_id) + start + 1
+        for start in range(0, len(tokens), SCAN_CHUNK_TOKENS)
+    ]
+    index = np.unique(np.concatenate([[0], *ends, [len(tokens)]]).astype(np.int64))
+    try:
+        # write next to the target and rename, so a concurrent reader never sees a partial file
+        np.save(cache_path + ".tmp.npy", index)
+        os.replace(cache_path + ".tmp.npy", cache_path)
+    except OSError:
+        pass  # e.g. a read-only data directory: rescan next time
+    return index
+
+
+class MixtureDataset:
+    """
+    Token shards memory-mapped in place and sampled as a weighted mixture.
+
+    Every source is a path or a glob of shards sharing one dtype. A window is
+    drawn by picking its source by weight (by default in proportion to the
+    source's tokens, as if the shards were concatenated), then a uniform start
+    among the windows of that source that do not cross a shard boundary. The
+    cumulative number of window starts per shard is precomputed for every
+    window length, so a draw costs a binary search over the source's shards.
+    """
+
+    def __init__(
+        self,
+        sources: list[str | os.PathLike],
+        weights: list[float] | None = None,
+        dtypes: list[str] | None = None,
+    ):
+        assert weights is None or len(weights) == len(sources)
+        assert dtypes is None or len(dtypes) == len(sources)
+        self.shards = []
+        shard_sources = []
+        for source_id, source in enumerate(sources):
+            dtype = np.dtype(dtypes[source_id] if dtypes is not None else np.uint16)
+            for path in sorted(glob.glob(os.fspath(source))) or [source]:
+                self.shards.append(np.memmap(path, dtype=dtype, mode="r"))
+                shard_sources.append(source_id)
+        self.shard_sources = np.array(shard_sources, dtype=np.int64)
+        self.shard_lengths = np.array([len(shard) for shard in self.shards], dtype=np.int64)
+        source_tokens = np.bincount(self.shard_sources, weights=self.shard_lengths, minlength=len(sources))
+        weights = np.asarray(weights if weights is not None else source_tokens, dtype=np.float64)
+        assert (weights >= 0).all() and weights.sum() > 0
+        self.weights = torch.from_numpy(weights / weights.sum())
+        # window length -> per source, its shard ids and the cumulative number of window starts in them
+        self._start_index: dict[int, list[tuple[np.ndarray, np.ndarray]]] = {}
+
+    def __len__(self) -> int:
+        return int(self.shard_lengths.sum())
+
+    def _starts(self, window: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        if window not in self._start_index:
+            num_starts = np.maximum(self.shard_lengths - window + 1, 0)
+            self._start_index[window] = [
+                (shard_ids, np.cumsum(num_starts[shard_ids]))
+                for shard_ids in (np.flatnonzero(self.shard_sources == s) for s in range(len(self.weights)))
+            ]
+        return self._start_index[window]
+
+    def sample(self, batch_size: int, window: int, generator: torch.Generator | None = None) -> np.ndarray:
+        """(batch_size, window) int64 tokens of independently sampled windows."""
+        index = self._starts(window)
+        sources = torch.multinomial(self.weights, batch_size, replacement=True, generator=generator).numpy()
+        windows = np.empty((batch_size, window), dtype=np.int64)
+        for source in np.unique(sources):
+            rows = np.flatnonzero(sources == source)
+            shard_ids, cumulative_starts = index[source]
+            if len(cumulative_starts) == 0 or cumulative_starts[-1] == 0:
+                raise ValueError(f"source {source} has no window of {window} tokens")
+            draws = torch.randint(int(cumulative_starts[-1]), (len(rows),), generator=generator).numpy()
+            shards = np.searchsorted(cumulative_starts, draws, side="right")
+            starts = draws - np.r_[0, cumulative_starts][shards]
+            for shard in np.unique(shards):
+                in_shard = shards == shard
+                windows[rows[in_shard]] = self.shards[shard_ids[shard]][starts[in_shard, None] + np.arange(window)]
+        return windows
+
+
+class DocumentDataset:
+    """
+    A token file sampled along its document boundaries (see `document_index`).
+
+    mode="doc_start" starts every window at a uniformly chosen document, so
+    short documents are as likely as long ones to open a window. mode="packed"
+    greedily packs the whole documents following a uniformly chosen one into
+    the window, truncating a first document longer than the window, and pads
+    the rest with IGNORE_INDEX. mode="random" samples like a plain memmap.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        mode: str = "doc_start",
+        dtype: npt.DTypeLike = np.uint16,
+        eos_token_id: int = EOS_TOKEN_ID,
+    ):
+        assert mode in SAMPLING_MODES
+        self.tokens = np.memmap(path, dtype=dtype, mode="r")
+        self.index = document_index(path, dtype, eos_token_id)
+        self.mode = mode
+        self.eos_token_id = eos_token_id
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def num_documents(self) -> int:
+        return len(self.index) - 1
+
+    def sample(self, batch_size: int, window: int, generator: torch.Generator | None = None) -> np.ndarray:
+        """(batch_size, window) int64 tokens of independently sampled windows."""
+        if self.mode == "random":
+            return sample_windows(self.tokens, batch_size, window, generator).astype(np.int64)
+        # documents whose start leaves room for a whole window
+        num_starts = int(np.searchsorted(self.index[:-1], len(self.tokens) - window, side="right"))
+        if num_starts == 0:
+            raise ValueError(f"no document starts a window of {window} tokens")
+        starts = np.asarray(self.index)[torch.randint(num_starts, (batch_size,), generator=generator).numpy()]
+        windows = self.tokens[starts[:, None] + np.arange(window)].astype(np.int64)
+        if self.mode == "packed":
+            # the last document boundary within the window, or the whole window if the first document fills it
+            ends = np.asarray(self.index)[np.searchsorted(self.index, starts + window, side="right") - 1]
+            lengths = np.where(ends > starts, ends - starts, window)
+            windows[np.arange(window) >= lengths[:, None]] = IGNORE_INDEX
+        return windows
+
+
+def sample_windows(
+    dataset: npt.NDArray | MixtureDataset | DocumentDataset,
+    batch_size: int,
+    window: int,
+    generator: torch.Generator | None = None,
+) -> np.ndarray:
+    """(batch_size, window) token windows at uniformly random starts, or drawn by the dataset's own sampler."""
+    if isinstance(dataset, (MixtureDataset, DocumentDataset)):
+        return dataset.sample(batch_size, window, generator)
+    starting_idxs = torch.randint(len(dataset) - window + 1, (batch_size,), generator=generator)
+    # gather every window at once
+    return dataset[starting_idxs.numpy()[:, None] + np.arange(window)]
+
+
+def split_windows(
+    windows: torch.Tensor, dataset: npt.NDArray | MixtureDataset | DocumentDataset
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Inputs and targets as views of the windows; packing padding is fed as EOS and left ignored in the targets."""
+    x, y = windows[:, :-1], windows[:, 1:]
+    if isinstance(dataset, DocumentDataset) and dataset.mode == "packed":
+        x = x.masked_fill(x == IGNORE_INDEX, dataset.eos_token_id)
+    return x, y
+
 
 def get_batch(
-    dataset: npt.NDArray, batch_size: int, context_length: int, device: str
+    dataset: npt.NDArray | MixtureDataset | DocumentDataset, batch_size: int, context_length: int, device: str
 ) -> tuple[torch.Tensor, torch.Tensor]:
-    starting_idxs = torch.randint(len(dataset) - context_length, (batch_size,))
-    x = torch.stack([
-            torch.from_numpy((dataset[i : i + context_length]).astype(np.int64))
-            for i in starting_idxs
-    ])  # fmt: skip
-    y = torch.stack(
-        [
-            torch.from_numpy((dataset[i + 1 : i + 1 + context_length]).astype(np.int64))
-            for i in starting_idxs
-        ]
-    )  # fmt: skip
+    # x and y are views into one buffer of windows of context_length + 1 tokens
+    windows = torch.from_numpy(sample_windows(dataset, batch_size, context_length + 1).astype(np.int64, copy=False))
     if "cuda" in device:
-        x = x.pin_memory().to(device, non_blocking=True)
-        y = y.pin_memory().to(device, non_blocking=True)
+        windows = windows.pin_memory().to(device, non_blocking=True)
     else:
-        x = x.to(device)
-        y = y.to(device)
-    return x, y
+        windows = windows.to(device)
+    return split_windows(windows, dataset)
+
+
+class PrefetchingBatchLoader:
+    """
+    An endless iterator of the (x, y) batches of `get_batch`, sampled by a
+    background thread into a ring of depth + 2 preallocated buffers (pinned,
+    with a matching ring on the device, when training on CUDA). Up to `depth`
+    batches are ready ahead of the training loop, which gets them without any
+    allocation.
+
+    A batch stays valid until two more batches have been taken, so the loop can
+    fetch the next batch while still using the current one. `wait_time` is the
+    total time `__next__` blocked waiting for the background thread.
+    """
+
+    def __init__(
+        self,
+        dataset: npt.NDArray | MixtureDataset | DocumentDataset,
+        batch_size: int,
+        context_length: int,
+        device: str,
+        depth: int = 2,
+        seed: int | None = None,
+    ):
+        assert depth >= 1
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.context_length = context_length
+        self.device = device
+        self.is_cuda = "cuda" in device
+        self.on_host = torch.device(device).type == "cpu"
+        num_slots = depth + 2
+        shape = (batch_size, context_length + 1)
+        self.host_buffers = [torch.empty(shape, dtype=torch.int64, pin_memory=self.is_cuda) for _ in range(num_slots)]
+        if self.on_host:
+            self.device_buffers = self.host_buffers
+        else:
+            self.device_buffers = [torch.empty(shape, dtype=torch.int64, device=device) for _ in range(num_slots)]
+        # set when the copy out of a host buffer has completed, before it may be refilled
+        self.copy_events: list[torch.cuda.Event | None] = [None] * num_slots
+        self.generator = torch.Generator().manual_seed(torch.initial_seed() if seed is None else seed)
+        self.wait_time = 0.0
+        self._free: queue.Queue = queue.Queue()
+        self._ready: queue.Queue = queue.Queue()
+        self._in_use: collections.deque[int] = collections.deque()
+        self._closed = False
+        for slot in range(num_slots):
+            self._free.put(slot)
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self) -> None:
+        try:
+            while (slot := self._free.get()) is not None:
+                if self.copy_events[slot] is not None:
+                    self.copy_events[slot].synchronize()
+                windows = sample_windows(self.dataset, self.batch_size, self.context_length + 1, self.generator)
+                np.copyto(self.host_buffers[slot].numpy(), windows)
+                self._ready.put(slot)
+        except Exception as e:
+            self._ready.put(e)
+
+    def __iter__(self) -> PrefetchingBatchLoader:
+        return self
+
+    def __next__(self) -> tuple[torch.Tensor, torch.Tensor]:
+        if self._closed:
+            raise StopIteration
+        start = time.perf_counter()
+        slot = self._ready.get()
+        self.wait_time += time.perf_counter() - start
+        if isinstance(slot, Exception):
+            self._ready.put(slot)
+            raise slot
+        buffer = self.device_buffers[slot]
+        if not self.on_host:
+            # ordered on the current stream, so the copy cannot overwrite a batch still being read
+            buffer.copy_(self.host_buffers[slot], non_blocking=self.is_cuda)
+        if self.is_cuda:
+            self.copy_events[slot] = torch.cuda.Event()
+            self.copy_events[slot].record()
+        # the caller may still hold the previous batch, recycle the one before it
+        self._in_use.append(slot)
+        if len(self._in_use) > 2:
+            self._free.put(self._in_use.popleft())
+        return split_windows(buffer, self.dataset)
+
+    def close(self) -> None:
+        self._closed = True
+        self._free.put(None)
+        self._thread.join()
+
+    def __enter__(self) -> PrefetchingBatchLoader:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -11,7 +11,12 @@ from omegaconf import MISSING
 
 @dataclass
 class PathsConfig:
-    train_bin: Path = MISSING
+    # either one token file, or train_bins: a list of sources (paths or globs of shards) sampled
+    # by train_weights (default: in proportion to their tokens), with one numpy dtype per source
+    train_bin: Path | None = None
+    train_bins: list[str] = field(default_factory=list)
+    train_weights: list[float] | None = None
+    train_dtypes: list[str] | None = None
     valid_bin: Path = MISSING
     model_output: Path = MISSING
 
@@ -50,6 +55,10 @@ class TrainingConfig:
     wandb_entity: str | None = None
     log_interval: int = 20
     save_checkpoints: bool = False
+    prefetch_depth: int = 2  # training batches sampled ahead by the background loader
+    # "random" windows, windows starting at a document ("doc_start") or whole documents "packed" into them
+    sampling: str = "random"
+    eos_token_id: int = 50256
 
 @dataclass
 class Config:
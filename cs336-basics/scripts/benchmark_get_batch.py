@@ -0,0 +1,90 @@
+"""
+Benchmark `get_batch`: the per-row slicing and torch.stack it replaced against
+the single fancy-indexed gather, on a memory-mapped uint16 token file.
+
+uv run python scripts/benchmark_get_batch.py --batch-sizes 8 32 128 512 --context-length 2048 --device cuda
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import numpy.typing as npt
+import torch
+
+from cs336_basics.data import get_batch
+
+
+def stacked_get_batch(
+    dataset: npt.NDArray, batch_size: int, context_length: int, device: str
+) -> tuple[torch.Tensor, torch.Tensor]:
+    starting_idxs = torch.randint(len(dataset) - context_length, (batch_size,))
+    x = torch.stack(
+        [torch.from_numpy((dataset[i : i + context_length]).astype(np.int64)) for i in starting_idxs]
+    )
+    y = torch.stack(
+        [torch.from_numpy((dataset[i + 1 : i + 1 + context_length]).astype(np.int64)) for i in starting_idxs]
+    )
+    if "cuda" in device:
+        x = x.pin_memory().to(device, non_blocking=True)
+        y = y.pin_memory().to(device, non_blocking=True)
+    else:
+        x = x.to(device)
+        y = y.to(device)
+    return x, y
+
+
+def time_batches(fn, dataset: npt.NDArray, batch_size: int, context_length: int, device: str, iters: int) -> float:
+    fn(dataset, batch_size, context_length, device)  # warm up
+    if "cuda" in device:
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(iters):
+        fn(dataset, batch_size, context_length, device)
+    if "cuda" in device:
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / iters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-tokens", type=int, default=500_000_000)
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[8, 32, 128, 512])
+    parser.add_argument("--context-length", type=int, default=2048)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--iters", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tokens.bin")
+        # write in chunks so the token file can be larger than memory
+        rng = np.random.default_rng(0)
+        with open(path, "wb") as f:
+            for start in range(0, args.num_tokens, 1 << 26):
+                rng.integers(0, 50257, size=min(1 << 26, args.num_tokens - start), dtype=np.uint16).tofile(f)
+        dataset = np.memmap(path, dtype=np.uint16, mode="r")
+
+        torch.manual_seed(0)
+        x, y = get_batch(dataset, 4, args.context_length, "cpu")
+        torch.manual_seed(0)
+        x_ref, y_ref = stacked_get_batch(dataset, 4, args.context_length, "cpu")
+        assert torch.equal(x, x_ref) and torch.equal(y, y_ref)
+
+        print(f"{args.num_tokens:,} tokens, context length {args.context_length}, device {args.device}")
+        print(f"{'batch size':>10} {'stacked ms':>12} {'gather ms':>12} {'speedup':>8} {'gather Mtok/s':>14}")
+        for batch_size in args.batch_sizes:
+            stacked = time_batches(stacked_get_batch, dataset, batch_size, args.context_length, args.device, args.iters)
+            gather = time_batches(get_batch, dataset, batch_size, args.context_length, args.device, args.iters)
+            tokens_per_second = batch_size * args.context_length / gather / 1e6
+            print(
+                f"{batch_size:>10} {stacked * 1e3:>12.2f} {gather * 1e3:>12.2f} "
+                f"{stacked / gather:>7.1f}x {tokens_per_second:>14.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -40,7 +40,7 @@ from torch.nn.parallel import DistributedDataParallel as DDP
 from tqdm import tqdm, trange
 
 import wandb
-from cs336_basics.data import get_batch
+from cs336_basics.data import DocumentDataset, MixtureDataset, PrefetchingBatchLoader, get_batch
 from cs336_basics.model import BasicsTransformerLM
 from cs336_basics.optimizer import get_cosine_lr
 from cs336_basics.train_config import Config, register_configs
@@ -64,7 +64,18 @@ def main(cfg: Config) -> None:
     default_cfg = OmegaConf.structured(Config())
     cfg = OmegaConf.merge(default_cfg, cfg_dict)
 
-    train_data = np.memmap(cfg.paths.train_bin, dtype=np.uint16, mode="r")
+    if cfg.paths.train_bins:
+        assert cfg.training.sampling == "random", "document-aware sampling needs a single paths.train_bin"
+        train_data = MixtureDataset(cfg.paths.train_bins, cfg.paths.train_weights, cfg.paths.train_dtypes)
+    else:
+        assert cfg.paths.train_bin is not None, "set paths.train_bin or paths.train_bins"
+        if cfg.training.sampling == "random":
+            train_data = np.memmap(cfg.paths.train_bin, dtype=np.uint16, mode="r")
+        else:
+            # builds (or loads) the document index cached next to the token file
+            train_data = DocumentDataset(
+                cfg.paths.train_bin, mode=cfg.training.sampling, eos_token_id=cfg.training.eos_token_id
+            )
     dev_data = np.memmap(cfg.paths.valid_bin, dtype=np.uint16, mode="r")
     model = BasicsTransformerLM(
         vocab_size=cfg.model.vocab_size,
@@ -171,13 +182,18 @@ def main(cfg: Config) -> None:
         fused=True,
     )
 
-    # Get the first batch
-    batch_x, batch_y = get_batch(
+    # Sample training batches on a background thread into reusable (pinned) buffers
+    train_loader = PrefetchingBatchLoader(
         train_data,
         batch_size=cfg.training.train_batch_size,
         context_length=cfg.model.context_length,
         device=cfg.training.device,
+        depth=cfg.training.prefetch_depth,
     )
+    logged_wait_time = 0.0
+
+    # Get the first batch
+    batch_x, batch_y = next(train_loader)
     for i in (pbar := trange(cfg.training.train_steps, desc="Training", disable=not is_master_process)):
         lr = get_cosine_lr(
             i,
@@ -198,16 +214,11 @@ def main(cfg: Config) -> None:
                 logits = model(batch_x)
 
                 # immediately async prefetch next batch while model is doing the forward pass on the GPU
-                next_batch_x, next_batch_y = get_batch(
-                    train_data,
-                    batch_size=cfg.training.train_batch_size,
-                    context_length=cfg.model.context_length,
-                    device=cfg.training.device,
-                )
+                next_batch_x, next_batch_y = next(train_loader)
 
                 # Calculate the loss with the logits
                 loss = (
-                    F.cross_entropy(logits.view(-1, logits.size(-1)), batch_y.view(-1))
+                    F.cross_entropy(logits.view(-1, logits.size(-1)), batch_y.reshape(-1))
                     / cfg.training.gradient_accumulation_steps
                 )
 
@@ -227,7 +238,10 @@ def main(cfg: Config) -> None:
         if is_master_process:
             pbar.set_description(f"Training step {i}, Loss: {loss_float:.4f}")
             if cfg.training.wandb_project and i % cfg.training.log_interval == 0:
-                wandb.log({"train_loss": loss_float, "lr": lr}, step=i)
+                # seconds the loop spent waiting for batches since the last log
+                data_wait_time = train_loader.wait_time - logged_wait_time
+                logged_wait_time = train_loader.wait_time
+                wandb.log({"train_loss": loss_float, "lr": lr, "data_wait_time": data_wait_time}, step=i)
 
         if i != 0 and i % cfg.training.eval_interval == 0 and is_master_process:
             dev_loss = estimate_dev_loss(
@@ -254,6 +268,10 @@ def main(cfg: Config) -> None:
                 # Write weights:
                 torch.save(model.state_dict(), model_weights_output_path)
 
+    train_loader.close()
+    if is_master_process:
+        logger.info(f"Waited {train_loader.wait_time:.1f}s for training batches")
+
     # Calculate final estimated dev loss
     if is_master_process:
         dev_loss = estimate_dev_loss(
@@ -296,7 +314,7 @@ def estimate_dev_loss(
             device=device,
         )
         logits = model(batch_x)
-        loss = F.cross_entropy(logits.view(-1, logits.size(-1)), batch_y.view(-1))
+        loss = F.cross_entropy(logits.view(-1, logits.size(-1)), batch_y.reshape(-1))
         losses[k] = loss.item()
 
     model.train()
@@ -0,0 +1,62 @@
+"""
+A Bloom filter over 64-bit hashes.
+
+The filter is a bit array of m bits with k probes per key, sized from the
+number of keys expected and the false-positive rate wanted:
+m = -n ln(p) / ln(2)^2 and k = m / n ln(2), about 14.4 bits (1.8 bytes) per
+key at p = 1e-3. The k probe positions come from double hashing (Kirsch and
+Mitzenmacher, "Less Hashing, Same Performance"): h1 + i * h2 mod m, with h1
+and h2 two mix64 finalizations of the key, so a whole batch of keys is probed
+with a handful of array operations.
+
+Lookups can return false positives but never false negatives. Past the
+expected number of keys the false-positive rate climbs; `estimated_fp_rate`
+gives the current rate from the fraction of bits set.
+"""
+import math
+
+import numpy as np
+
+from cs336_data.hashing import POPCOUNT, mix64
+
+# keys are finalized twice with different seeds to get independent h1 and h2
+H2_SEED = np.uint64(0x9E3779B97F4A7C15)
+
+
+class BloomFilter:
+    def __init__(self, expected_items: int, fp_rate: float = 1e-3):
+        assert 0 < fp_rate < 1
+        expected_items = max(expected_items, 1)
+        self.num_bits = max(math.ceil(-expected_items * math.log(fp_rate) / math.log(2) ** 2), 64)
+        self.num_probes = max(round(self.num_bits / expected_items * math.log(2)), 1)
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def _probes(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Byte index and bit mask of the num_probes positions of every hash, both (len(hashes), num_probes)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = mix64(hashes)
+        h2 = mix64(hashes ^ H2_SEED) | np.uint64(1)
+        # uint64 arithmetic wraps around before the modulo, which only perturbs the probe sequence
+        positions = (h1[:, None] + np.arange(self.num_probes, dtype=np.uint64) * h2[:, None]) % np.uint64(self.num_bits)
+        return positions >> np.uint64(3), np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+
+    def add(self, hashes: np.ndarray) -> None:
+        byte_index, mask = self._probes(hashes)
+        np.bitwise_or.at(self.bits, byte_index.ravel(), mask.ravel())
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """Whether every hash may have been added (false positives at about estimated_fp_rate)."""
+        byte_index, mask = self._probes(hashes)
+        return np.all(self.bits[byte_index] & mask, axis=1)
+
+    def fill_ratio(self) -> float:
+        """Fraction of bits set."""
+        return int(POPCOUNT[self.bits].sum(dtype=np.int64)) / self.num_bits
+
+    def estimated_fp_rate(self) -> float:
+        """Probability that a key never added is reported present: every one of its probes hits a set bit."""
+        return self.fill_ratio() ** self.num_probes
@@ -0,0 +1,149 @@
+"""
+Train/validation contamination check over tokenized corpora.
+
+Both inputs are flat uint16 token files as written by `cs336_data.filter.tokenize`
+(e.g. our filtered training data and `paths.valid_bin`, the Paloma C4
+validation set used by `train.py`), with every document ending in EOS. A
+training document is contaminated when one of its windows of n tokens also
+occurs in a validation document; windows never cross a document boundary.
+
+Every validation window is hashed with a rolling hash into a sorted array of
+unique 64-bit hashes. The training file is then streamed from a memmap in
+chunks: its windows are hashed the same way and looked up, first in a bitmap on
+the top hash bits that rejects nearly every window with a single gather, and
+only the survivors with a binary search in the sorted hashes. As for the other
+hash-based tools a collision can only flag a clean document, and with 64-bit
+hashes that is unlikely even for billions of windows.
+
+uv run python -m cs336_data.contamination data/train.bin data/valid.bin --ngram-size 13 --output-path data/train.clean.bin
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+
+from cs336_data.hashing import sorted_contains
+from cs336_data.substring_dedup import EOS_TOKEN_ID, document_windows, iter_chunks
+
+# bits of prefilter per validation window, and the largest prefilter (128 MiB of bools)
+PREFILTER_BITS_PER_KEY = 4
+MAX_PREFILTER_BITS = 27
+
+
+class WindowSet:
+    """Sorted unique window hashes with a bitmap prefilter on their top bits."""
+
+    def __init__(self, hashes: np.ndarray):
+        self.hashes = np.unique(hashes)
+        bits = math.ceil(math.log2(max(len(self.hashes), 1))) + PREFILTER_BITS_PER_KEY
+        self.bits = min(max(bits, 8), MAX_PREFILTER_BITS)
+        self.prefilter = np.zeros(1 << self.bits, dtype=bool)
+        self.prefilter[self.hashes >> np.uint64(64 - self.bits)] = True
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """Membership of every hash."""
+        found = self.prefilter[hashes >> np.uint64(64 - self.bits)]
+        candidates = np.flatnonzero(found)
+        found[candidates] = sorted_contains(self.hashes, hashes[candidates])
+        return found
+
+
+def validation_windows(valid_path: os.PathLike, ngram_size: int, eos_token_id: int = EOS_TOKEN_ID) -> WindowSet:
+    """The set of windows of ngram_size tokens of every document in the token file at valid_path."""
+    tokens = np.memmap(valid_path, dtype=np.uint16, mode="r")
+    hashes = [np.zeros(0, dtype=np.uint64)]
+    for start, stop, chunk in iter_chunks(tokens, overlap=ngram_size - 1):
+        positions, chunk_hashes = document_windows(chunk, ngram_size, eos_token_id)
+        hashes.append(np.unique(chunk_hashes[positions < stop - start]))
+    return WindowSet(np.concatenate(hashes))
+
+
+def contaminated_documents(
+    train_path: os.PathLike, windows: WindowSet, ngram_size: int, eos_token_id: int = EOS_TOKEN_ID
+) -> tuple[np.ndarray, int]:
+    """
+    Sorted indices of the documents of the token file at train_path that share a
+    window with `windows`, and the number of shared windows.
+    """
+    tokens = np.memmap(train_path, dtype=np.uint16, mode="r")
+    doc_ids = [np.zeros(0, dtype=np.int64)]
+    matched_windows = 0
+    docs_before = 0
+    for start, stop, chunk in iter_chunks(tokens, overlap=ngram_size - 1):
+        positions, hashes = document_windows(chunk, ngram_size, eos_token_id)
+        keep = positions < stop - start
+        positions = positions[keep][windows.contains(hashes[keep])]
+        matched_windows += len(positions)
+        eos = np.flatnonzero(chunk[:stop - start] == eos_token_id)
+        # a window is in the document after every EOS before it
+        doc_ids.append(np.unique(docs_before + np.searchsorted(eos, positions)))
+        docs_before += len(eos)
+    return np.unique(np.concatenate(doc_ids)), matched_windows
+
+
+def remove_documents(
+    input_path: os.PathLike, output_path: os.PathLike, doc_ids: np.ndarray, eos_token_id: int = EOS_TOKEN_ID
+) -> int:
+    """Copy the token file at input_path without the documents at the sorted doc_ids. Returns the tokens written."""
+    tokens = np.memmap(input_path, dtype=np.uint16, mode="r")
+    written = 0
+    docs_before = 0
+    with open(output_path, "wb") as fout:
+        for _, _, chunk in iter_chunks(tokens):
+            is_eos = chunk == eos_token_id
+            # document of every token: its EOS belongs to it
+            token_docs = docs_before + np.cumsum(is_eos) - is_eos
+            kept = chunk[~sorted_contains(doc_ids, token_docs)]
+            kept.tofile(fout)
+            written += len(kept)
+            docs_before += int(np.count_nonzero(is_eos))
+    return written
+
+
+def check_contamination(
+    train_path: os.PathLike,
+    valid_path: os.PathLike,
+    ngram_size: int = 13,
+    output_path: os.PathLike | None = None,
+    eos_token_id: int = EOS_TOKEN_ID,
+) -> dict:
+    """
+    Find the training documents that share a window of ngram_size tokens with
+    the validation set and, if output_path is given, write the training tokens
+    without them. Next to the output, `<output_path>.removed.npy` holds the
+    indices of the removed documents. Returns token, window and document counts.
+    """
+    windows = validation_windows(valid_path, ngram_size, eos_token_id)
+    doc_ids, matched_windows = contaminated_documents(train_path, windows, ngram_size, eos_token_id)
+    train_tokens = np.memmap(train_path, dtype=np.uint16, mode="r")
+    stats = {
+        "train_tokens": len(train_tokens),
+        "valid_tokens": os.path.getsize(valid_path) // np.dtype(np.uint16).itemsize,
+        "valid_windows": len(windows),
+        "matched_windows": matched_windows,
+        "train_docs": sum(int(np.count_nonzero(chunk == eos_token_id)) for _, _, chunk in iter_chunks(train_tokens))
+        + int(len(train_tokens) > 0 and train_tokens[-1] != eos_token_id),
+        "contaminated_docs": len(doc_ids),
+    }
+    if output_path is not None:
+        stats["output_tokens"] = remove_documents(train_path, output_path, doc_ids, eos_token_id)
+        stats["removed_tokens"] = stats["train_tokens"] - stats["output_tokens"]
+        np.save(f"{output_path}.removed.npy", doc_ids)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("train_path", help="uint16 token file, documents separated by EOS")
+    parser.add_argument("valid_path", help="uint16 token file of the validation set, e.g. paths.valid_bin")
+    parser.add_argument("--ngram-size", type=int, default=13, help="window length in tokens")
+    parser.add_argument("--output-path", default=None, help="write the training tokens without contaminated documents")
+    parser.add_argument("--eos-token-id", type=int, default=EOS_TOKEN_ID)
+    args = parser.parse_args()
+    stats = check_contamination(args.train_path, args.valid_path, args.ngram_size, args.output_path, args.eos_token_id)
+    for name, value in stats.items():
+        print(f"{name}: {value:,}")
@@ -1,10 +1,46 @@
-import collections
+from collections.abc import Callable, Iterable
+import concurrent.futures
+import contextlib
+import functools
 import hashlib
-import random
-import re
+import io
+import itertools
+import json
+import math
 import os
+import shutil
+import sys
+import tempfile
+import time
 import unicodedata
 
+import numpy as np
+from xopen import xopen
+
+from cs336_data import profiling
+from cs336_data.bloom import BloomFilter
+from cs336_data.hashing import (
+    MAX_COUNT,
+    MAX_PARTITION_BITS,
+    SORT_OVERHEAD,
+    HashCounter,
+    hash_lines,
+    read_records,
+    sorted_contains,
+    split_by_prefix,
+)
+from cs336_data.lsh import (
+    MAX_BUCKET_SIZE,
+    MinHashLSHIndex,
+    bucket_size_histogram,
+    cluster_representatives,
+    connected_components,
+    iter_candidate_pairs,
+)
+from cs336_data.minhash import MinHasher, hash_word_ngrams
+from cs336_data.profiling import timed
+from cs336_data.simhash import SimHasher, hamming_distance, table_keys
+
 
 """
 uv run pytest -k test_exact_line_deduplication
@@ -12,51 +48,414 @@ uv run pytest -k test_minhash_deduplication
 """
 
 
+COMPRESSED_EXTENSIONS = (".gz", ".bz2", ".xz", ".zst")
+IO_THREADS = 1  # each compressed file is (de)compressed in one background thread or process
+
+
 def hash_string_blake2(s: str) -> str:
     return hashlib.blake2b(s.encode("utf-8"), digest_size=16).hexdigest()
 
 
-def exact_dedup(input_files: list[os.PathLike], output_directory: os.PathLike) -> None:
-    myd = collections.defaultdict(int)
-    for input_file in input_files:
-        output_file = os.path.join(output_directory, os.path.basename(input_file))
-        if not os.path.isfile(input_file):
-            continue
-        with open(input_file, "r", encoding="utf-8", errors="replace") as fin:
-            for line in fin:
-                tmp = line.rstrip("\n")
-                hash_line = hash_string_blake2(tmp)
-                myd[hash_line] += 1
+def _is_compressed(path: os.PathLike) -> bool:
+    return os.fspath(path).endswith(COMPRESSED_EXTENSIONS)
+
+
+def _open(path: os.PathLike, mode: str, **kwargs):
+    """
+    Open an input or output shard. Compressed shards are streamed through xopen,
+    which picks the codec from the extension (from the file signature when
+    reading) and runs it in the background, overlapping with our hashing.
+    """
+    if not _is_compressed(path):
+        return open(path, mode, **kwargs)
+    return xopen(path, mode, threads=IO_THREADS, **kwargs)
+
+
+def _iter_line_hashes(path: os.PathLike, batch_size: int = 1 << 16):
+    """Yield (lines, uint64 line hashes) in batches, lines keep their newline."""
+    with _open(path, "r", encoding="utf-8", errors="replace") as fin:
+        while lines := list(itertools.islice(fin, batch_size)):
+            yield lines, hash_lines(lines, len(lines))
+
+
+def exact_dedup(
+    input_files: list[os.PathLike],
+    output_directory: os.PathLike,
+    memory_limit: int | None = None,
+    num_workers: int = 1,
+    tmp_dir: os.PathLike | None = None,
+    hash_store: os.PathLike | None = None,
+    report_path: os.PathLike | None = None,
+) -> dict:
+    """
+    Keep only the lines that occur exactly once across all input files.
+
+    By default every line hash is counted in one in-memory HashCounter. Given a
+    memory limit in bytes or more than one worker, line hashes are instead
+    spilled into hash-partitioned files under `tmp_dir`: workers hash the input
+    files concurrently, every partition is counted on its own, and the rewrite
+    pass runs one worker per file, looking lines up in the sorted array of
+    duplicate hashes. Both paths produce identical output.
+
+    Inputs ending in .gz, .bz2, .xz or .zst are decompressed while streaming,
+    and their outputs, which keep the input file name, are compressed the same
+    way.
 
+    `hash_store` is a directory holding the line hashes of earlier runs (see
+    HashCounter.save). Lines found there are dropped as well, and the lines of
+    this run are added to it afterwards, so successive crawls are deduplicated
+    against each other without reprocessing the old ones.
+
+    Returns a report of line and byte counts and the wall time of every stage
+    (counting line hashes, writing the outputs, updating the hash store), also
+    written as JSON to report_path if given.
+    """
+    input_files = [input_file for input_file in input_files if os.path.isfile(input_file)]
+    output_files = [os.path.join(output_directory, os.path.basename(input_file)) for input_file in input_files]
+    store_exists = hash_store is not None and os.path.isfile(os.path.join(hash_store, "meta.json"))
+    timer = _StageTimer()
+    if memory_limit is None and num_workers == 1:
+        counter = HashCounter()
+        for input_file in input_files:
+            for _, hashes in _iter_line_hashes(input_file):
+                counter.add(hashes)
+        timer.stop("count")
+        store = HashCounter.load(hash_store) if store_exists else HashCounter()
+        line_counts = [
+            _write_unique_lines(
+                input_file, output_file, lambda hashes: (counter.get(hashes) != 1) | (store.get(hashes) != 0)
+            )
+            for input_file, output_file in zip(input_files, output_files)
+        ]
+        timer.stop("write")
+        if hash_store is not None:
+            store.merge(counter)
+            store.save(hash_store)
+            timer.stop("store")
+    else:
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as spill_dir, _executor(num_workers) as executor:
+            duplicates_path, counts_paths = _spilled_duplicate_hashes(
+                input_files, spill_dir, memory_limit, num_workers, executor, keep_counts=hash_store is not None
+            )
+            timer.stop("count")
+            duplicates_paths = [duplicates_path] * len(input_files)
+            store_paths = [hash_store if store_exists else None] * len(input_files)
+            line_counts = list(
+                executor.map(_write_unique_file, input_files, output_files, duplicates_paths, store_paths)
+            )
+            timer.stop("write")
+            if hash_store is not None:
+                store = HashCounter.load(hash_store) if store_exists else HashCounter()
+                for counts_path in counts_paths:
+                    records = np.fromfile(counts_path, dtype=SPILL_RECORD)
+                    store.add_counts(records["key"], records["count"])
+                store.save(hash_store)
+                timer.stop("store")
+
+    input_lines = sum(num_lines for num_lines, _ in line_counts)
+    output_lines = sum(num_kept for _, num_kept in line_counts)
+    report = {
+        "input_files": len(input_files),
+        "input_lines": input_lines,
+        "output_lines": output_lines,
+        "duplicate_lines": input_lines - output_lines,
+        "duplicate_ratio": (input_lines - output_lines) / max(input_lines, 1),
+        **_byte_counts(input_files, output_files),
+        "seconds": timer.seconds(),
+    }
+    _write_report(report, report_path)
+    return report
+
+
+def bloom_dedup(
+    input_files: list[os.PathLike],
+    output_directory: os.PathLike,
+    expected_lines: int,
+    fp_rate: float = 1e-3,
+) -> dict:
+    """
+    Single-pass approximate line dedup: keep the first occurrence of every line
+    across the input files, in order, and drop the lines seen before.
+
+    Unlike `exact_dedup`, which keeps only the lines that occur exactly once
+    and reads every input twice, each input is read once and the seen lines are
+    tracked in a BloomFilter sized for expected_lines at fp_rate, so memory is
+    fixed up front. A false positive drops a line that was unique. Returns line
+    counts, throughput and the false-positive rate estimated from the final
+    filter, which exceeds fp_rate if there were more than expected_lines
+    distinct lines.
+    """
+    input_files = [input_file for input_file in input_files if os.path.isfile(input_file)]
+    seen = BloomFilter(expected_lines, fp_rate)
+    num_lines = num_kept = 0
+    start = time.perf_counter()
     for input_file in input_files:
         output_file = os.path.join(output_directory, os.path.basename(input_file))
-        if not os.path.isfile(input_file):
-            continue
-        with open(input_file, "r", encoding="utf-8", errors="replace") as fin, \
-            open(output_file, "w", encoding="utf-8") as fout:
-            for line in fin:
-                tmp = line.rstrip("\n")
-                hash_line = hash_string_blake2(tmp)
-                if myd[hash_line] == 1:
-                    fout.write(line)
+        with _open(output_file, "w", encoding="utf-8") as fout:
+            for lines, hashes in _iter_line_hashes(input_file):
+                # the filter only knows earlier batches, so repeats within the batch are found by hash
+                first = np.zeros(len(hashes), dtype=bool)
+                first[np.unique(hashes, return_index=True)[1]] = True
+                keep = first & ~seen.contains(hashes)
+                seen.add(hashes[keep])
+                fout.writelines(itertools.compress(lines, keep))
+                num_lines += len(lines)
+                num_kept += int(np.count_nonzero(keep))
+    elapsed = time.perf_counter() - start
+    num_bytes = sum(os.path.getsize(input_file) for input_file in input_files)
+    return {
+        "lines": num_lines,
+        "kept_lines": num_kept,
+        "dropped_lines": num_lines - num_kept,
+        "bloom_bytes": seen.nbytes,
+        "bloom_probes": seen.num_probes,
+        "fill_ratio": seen.fill_ratio(),
+        "estimated_fp_rate": seen.estimated_fp_rate(),
+        "seconds": elapsed,
+        "lines_per_second": num_lines / max(elapsed, 1e-9),
+        "bytes_per_second": num_bytes / max(elapsed, 1e-9),
+    }
+
+
+class _StageTimer:
+    """Wall time of consecutive stages: stop(name) ends the stage that started at the previous stop."""
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def stop(self, name: str) -> None:
+        now = time.perf_counter()
+        self.add(name, now - self.last)
+        self.last = now
+
+    def add(self, name: str, seconds: float) -> None:
+        """Account time measured elsewhere, e.g. summed over workers."""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def seconds(self) -> dict[str, float]:
+        return {**self.stages, "total": time.perf_counter() - self.start}
+
+
+def _byte_counts(input_files: list[os.PathLike], output_files: list[os.PathLike]) -> dict[str, int]:
+    """Input and output bytes on disk (compressed, for compressed shards)."""
+    return {
+        "input_bytes": sum(os.path.getsize(path) for path in input_files),
+        "output_bytes": sum(os.path.getsize(path) for path in output_files if os.path.exists(path)),
+    }
+
+
+def _write_report(report: dict, report_path: os.PathLike | None) -> None:
+    if report_path is not None:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def _executor(num_workers: int) -> concurrent.futures.Executor:
+    if num_workers > 1:
+        return concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, initializer=profiling.worker_init)
+    # runs the tasks one at a time, in order, inside this process
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+
+def _write_unique_lines(input_file: os.PathLike, output_file: os.PathLike, is_duplicate) -> tuple[int, int]:
+    """Copy the lines that are not duplicates, return the number of lines read and written."""
+    num_lines = num_kept = 0
+    with _open(output_file, "w", encoding="utf-8") as fout:
+        for lines, hashes in _iter_line_hashes(input_file):
+            keep = ~is_duplicate(hashes)
+            fout.writelines(itertools.compress(lines, keep))
+            num_lines += len(lines)
+            num_kept += int(np.count_nonzero(keep))
+    return num_lines, num_kept
+
+
+def _write_unique_file(
+    input_file: os.PathLike, output_file: os.PathLike, duplicates_path: str, hash_store: str | None
+) -> tuple[int, int]:
+    duplicates = _load_sorted_keys(duplicates_path)
+    if hash_store is None:
+        return _write_unique_lines(input_file, output_file, lambda hashes: sorted_contains(duplicates, hashes))
+    store = HashCounter.load(hash_store, mmap_mode="r")
+    return _write_unique_lines(
+        input_file, output_file, lambda hashes: sorted_contains(duplicates, hashes) | (store.get(hashes) != 0)
+    )
+
+
+def _load_sorted_keys(path: str) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    return np.memmap(path, dtype=np.uint64, mode="r")
+
+
+# A spilled line hash with the number of times it occurred in one batch (saturated)
+SPILL_RECORD = np.dtype([("key", "<u8"), ("count", "u1")])
+SPLIT_BITS = 4  # an oversized partition is split 16 ways on the following hash bits
+MIN_PARTITION_BUDGET = 1 << 16
+
+
+def _spilled_duplicate_hashes(
+    input_files: list[os.PathLike],
+    spill_dir: str,
+    memory_limit: int | None,
+    num_workers: int,
+    executor: concurrent.futures.Executor,
+    keep_counts: bool = False,
+) -> tuple[str, list[str]]:
+    """
+    Spill, count and merge every partition. Returns the path of the sorted
+    duplicate hashes and, with keep_counts, the per-partition files holding the
+    total count of every distinct hash.
+    """
+    # a few partitions per worker so that counting balances across the pool
+    bits = math.ceil(math.log2(4 * num_workers)) if num_workers > 1 else 0
+    budget = sys.maxsize
+    if memory_limit is not None:
+        budget = max(memory_limit // num_workers, MIN_PARTITION_BUDGET)
+        # assume ~32 bytes per line to size the partitions, oversized ones get split later
+        estimate = sum(os.path.getsize(p) for p in input_files) // 32 * SPILL_RECORD.itemsize * SORT_OVERHEAD
+        bits = max(bits, math.ceil(math.log2(max(estimate / budget, 1))))
+    bits = min(bits, MAX_PARTITION_BITS)
+
+    spill_paths = [os.path.join(spill_dir, f"spill{i:06d}.bin") for i in range(len(input_files))]
+    offsets = list(executor.map(_spill_line_hashes, input_files, spill_paths, [bits] * len(input_files)))
+
+    # partition p of a spill file is one record range per batch
+    num_partitions = 1 << bits
+    segments = [
+        [
+            (spill_path, start, end)
+            for spill_path, batch_offsets in zip(spill_paths, offsets)
+            for start, end in zip(batch_offsets[:, p], batch_offsets[:, p + 1])
+            if end > start
+        ]
+        for p in range(num_partitions)
+    ]
+    counts_paths = [os.path.join(spill_dir, f"part{p:03d}.counts") for p in range(num_partitions)]
+    list(executor.map(
+        _count_partition,
+        segments,
+        [bits] * num_partitions,
+        [budget] * num_partitions,
+        counts_paths,
+        [keep_counts] * num_partitions,
+    ))
+    for spill_path in spill_paths:
+        os.remove(spill_path)
+
+    # partitions are ranges of the top hash bits, so concatenating them in order stays sorted
+    duplicates_path = os.path.join(spill_dir, "duplicates.bin")
+    with open(duplicates_path, "wb") as fout:
+        for counts_path in counts_paths:
+            records = np.fromfile(counts_path, dtype=SPILL_RECORD)
+            records["key"][records["count"] >= MAX_COUNT].tofile(fout)
+            if not keep_counts:
+                os.remove(counts_path)
+    return duplicates_path, counts_paths if keep_counts else []
+
+
+def _spill_line_hashes(input_file: os.PathLike, spill_path: str, bits: int) -> np.ndarray:
+    """
+    Write the (hash, count) records of every batch of lines to spill_path, sorted
+    by hash. Returns the record offsets of each partition per batch, shaped
+    (num_batches, 2**bits + 1).
+    """
+    offsets = []
+    written = 0
+    with open(spill_path, "wb") as fout:
+        for _, hashes in _iter_line_hashes(input_file):
+            keys, counts = np.unique(hashes, return_counts=True)
+            records = np.empty(len(keys), dtype=SPILL_RECORD)
+            records["key"] = keys
+            records["count"] = np.minimum(counts, MAX_COUNT)
+            records.tofile(fout)
+            offsets.append(written + split_by_prefix(keys, 0, bits))
+            written += len(records)
+    return np.array(offsets, dtype=np.int64).reshape(-1, (1 << bits) + 1)
+
+
+def _count_partition(
+    segments: list[tuple[str, int, int]], prefix_bits: int, budget: int, output_path: str, all_keys: bool = False
+) -> None:
+    """
+    Write the sorted distinct hashes of one partition with their total
+    (saturated) counts to output_path, only those seen more than once unless
+    all_keys is set.
+    """
+    size = sum(end - start for _, start, end in segments) * SPILL_RECORD.itemsize
+    if size * SORT_OVERHEAD > budget and prefix_bits + SPLIT_BITS <= 32:
+        # too big to sort in memory: stream it into sub-partitions on the next hash bits
+        sub_paths = [f"{output_path}.{i:x}.bin" for i in range(1 << SPLIT_BITS)]
+        handles = [open(path, "wb") for path in sub_paths]
+        chunk = max(budget // (SPILL_RECORD.itemsize * SORT_OVERHEAD), 1)
+        for path, start, end in segments:
+            for chunk_start in range(start, end, chunk):
+                records = read_records(path, chunk_start, min(chunk_start + chunk, end), SPILL_RECORD)
+                records = records[np.argsort(records["key"], kind="stable")]
+                bounds = split_by_prefix(records["key"], prefix_bits, SPLIT_BITS)
+                for handle, lo, hi in zip(handles, bounds[:-1], bounds[1:]):
+                    if hi > lo:
+                        records[lo:hi].tofile(handle)
+        for handle in handles:
+            handle.close()
+        with open(output_path, "wb") as fout:
+            for sub_path in sub_paths:
+                sub_records = os.path.getsize(sub_path) // SPILL_RECORD.itemsize
+                sub_output = sub_path + ".counts"
+                _count_partition([(sub_path, 0, sub_records)], prefix_bits + SPLIT_BITS, budget, sub_output, all_keys)
+                with open(sub_output, "rb") as fin:
+                    shutil.copyfileobj(fin, fout)
+                os.remove(sub_path)
+                os.remove(sub_output)
+        return
+
+    records = [read_records(*segment, SPILL_RECORD) for segment in segments]
+    records = np.concatenate(records or [np.zeros(0, SPILL_RECORD)])
+    records = records[np.argsort(records["key"], kind="stable")]
+    keys = records["key"]
+    if len(keys) == 0:
+        open(output_path, "wb").close()
+        return
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    totals = np.minimum(np.add.reduceat(records["count"].astype(np.int64), starts), MAX_COUNT)
+    counted = records[starts]
+    counted["count"] = totals
+    if not all_keys:
+        counted = counted[totals >= MAX_COUNT]
+    counted.tofile(output_path)
 
 
 # Text normalization
+class _NormalizeTable(dict):
+    """
+    str.translate table that decides every code point once and caches it:
+    combining marks (Mn) are dropped, characters that are neither word
+    characters nor whitespace (what the regex [^\\w\\s] matches) become spaces.
+    """
+
+    def __missing__(self, codepoint: int) -> int | str | None:
+        c = chr(codepoint)
+        if unicodedata.category(c) == "Mn":
+            value = None
+        elif c.isalnum() or c == "_" or c.isspace():
+            value = codepoint
+        else:
+            value = " "
+        self[codepoint] = value
+        return value
+
+
+_NORMALIZE_TABLE = _NormalizeTable()
+for _codepoint in range(128):
+    _NORMALIZE_TABLE.__missing__(_codepoint)
+
+
+@timed
 def normalize_text(text: str) -> str:
-    # lowercase
-    text = text.lower()
-    # remove punctuation
-    text = re.sub(r"[^\w\s]", " ", text)
-    # normalize whitespace
-    text = re.sub(r"\s+", " ", text).strip()
-    # Remove accents (diacritics)
-    text = "".join(
-        c for c in text
-        if unicodedata.category(c) != "Mn"
-    )
-    # Unicode NFD normalization
-    text = unicodedata.normalize("NFD", text)
-    return text
+    # lowercase, then NFD so that accents become separate combining marks
+    text = unicodedata.normalize("NFD", text.lower())
+    # drop the combining marks, punctuation to spaces, then normalize whitespace
+    return " ".join(text.translate(_NORMALIZE_TABLE).split())
 
 
 def word_ngrams(text: str, n: int):
@@ -67,6 +466,7 @@ def word_ngrams(text: str, n: int):
 # MinHash
 # minhash(hi,S) = min(hi(s1),hi(s2),...,hi(sn))
 # s1, s2,...,sn are n-grams for S
+@timed
 def minhash_signature(ngrams: set, num_hashes: int) -> list[int]:
     signature = []
     for i in range(num_hashes):
@@ -79,6 +479,266 @@ def minhash_signature(ngrams: set, num_hashes: int) -> list[int]:
     return signature
 
 
+DOC_MODES = ("file", "line", "jsonl")
+CHUNK_DOCS = 10_000  # documents per signature task
+SIGN_BATCH = 1024  # signature rows buffered while signing a chunk
+VERIFY_BATCH = 1 << 14  # candidate pairs compared at once
+SIGNATURE_STAGES = ("read", "normalize", "signature")  # timed per document while signing
+REPRESENTATIVES = ("first", "longest")
+ENGINES = ("minhash", "simhash")
+
+
+def _document_chunks(
+    path: os.PathLike, doc_mode: str, chunk_docs: int = CHUNK_DOCS
+) -> list[tuple[int, int | None]]:
+    """
+    (byte offset, number of documents) of consecutive chunks of the documents in
+    path. A compressed file cannot be seeked into, and counting its documents
+    would mean decompressing it once more, so it is a single chunk of unknown
+    length (None).
+    """
+    if doc_mode == "file":
+        return [(0, 1)]
+    if _is_compressed(path):
+        return [(0, None)]
+    chunks = []
+    offset = 0
+    with open(path, "rb") as f:
+        while lines := list(itertools.islice(f, chunk_docs)):
+            chunks.append((offset, len(lines)))
+            offset += sum(map(len, lines))
+    return chunks
+
+
+def _iter_documents(path: os.PathLike, doc_mode: str, text_key: str, offset: int = 0, num_docs: int | None = None):
+    """Yield the text of every document in path: the whole file, each line, or each JSONL record."""
+    with _open(path, "rb") as f:
+        if doc_mode == "file":
+            yield f.read().decode("utf-8", errors="replace")
+            return
+        if offset:
+            f.seek(offset)
+        for line in itertools.islice(f, num_docs):
+            line = line.decode("utf-8", errors="replace")
+            if doc_mode == "jsonl":
+                yield json.loads(line)[text_key] if line.strip() else ""
+            else:
+                yield line.rstrip("\n")
+
+
+def _chunk_signatures(
+    path: os.PathLike,
+    offset: int,
+    num_docs: int | None,
+    out: np.ndarray | io.IOBase,
+    hasher: MinHasher,
+    doc_mode: str,
+    text_key: str,
+    ngram_size: int,
+    ngrams_path: str | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sign num_docs documents from offset, or every document to the end of the
+    file when num_docs is None, into out: an array with a row per document, or
+    a binary file the rows are appended to. Returns the number of distinct
+    n-grams of every document and the seconds spent in each of
+    SIGNATURE_STAGES. With ngrams_path the sorted n-gram hashes of the chunk are
+    also written there, one document after the other.
+    """
+    num_ngrams = []
+    batch = np.empty((SIGN_BATCH, hasher.num_hashes), dtype=hasher.dtype)
+    read_seconds = normalize_seconds = signature_seconds = 0.0
+    with open(ngrams_path, "wb") if ngrams_path else contextlib.nullcontext() as fout:
+        start = time.perf_counter()
+        for i, text in enumerate(_iter_documents(path, doc_mode, text_key, offset, num_docs)):
+            read_end = time.perf_counter()
+            normalized = normalize_text(text)
+            normalize_end = time.perf_counter()
+            ngrams = hash_word_ngrams(normalized, ngram_size)
+            batch[i % SIGN_BATCH] = hasher.signature(ngrams)
+            num_ngrams.append(len(ngrams))
+            if (i + 1) % SIGN_BATCH == 0:
+                _write_rows(out, i + 1 - SIGN_BATCH, batch)
+            if fout is not None:
+                ngrams.tofile(fout)
+            signature_end = time.perf_counter()
+            read_seconds += read_end - start
+            normalize_seconds += normalize_end - read_end
+            signature_seconds += signature_end - normalize_end
+            start = signature_end
+    num_full = len(num_ngrams) - len(num_ngrams) % SIGN_BATCH
+    _write_rows(out, num_full, batch[:len(num_ngrams) - num_full])
+    return np.array(num_ngrams, dtype=np.int64), np.array([read_seconds, normalize_seconds, signature_seconds])
+
+
+def _write_rows(out: np.ndarray | io.IOBase, row_start: int, rows: np.ndarray) -> None:
+    if isinstance(out, np.ndarray):
+        out[row_start:row_start + len(rows)] = rows
+    else:
+        out.write(rows.tobytes())
+
+
+def _ngrams_chunk_path(ngrams_dir: str, task: int) -> str:
+    return os.path.join(ngrams_dir, f"ngrams{task:08d}.bin")
+
+
+def _chunk_signatures_to_file(
+    path: os.PathLike,
+    offset: int,
+    num_docs: int,
+    row_start: int,
+    ngrams_path: str | None,
+    signatures_path: str,
+    hasher: MinHasher | SimHasher,
+    **kwargs,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Worker side of _chunk_signatures: write the rows straight into the shared memory-mapped matrix."""
+    row_bytes = hasher.num_hashes * hasher.dtype.itemsize
+    shape = (num_docs, hasher.num_hashes)
+    out = np.memmap(signatures_path, dtype=hasher.dtype, mode="r+", offset=row_start * row_bytes, shape=shape)
+    result = _chunk_signatures(path, offset, num_docs, out, hasher, ngrams_path=ngrams_path, **kwargs)
+    out.flush()
+    return result
+
+
+def _stream_signatures_to_file(
+    path: os.PathLike, rows_path: str, ngrams_path: str | None, hasher: MinHasher | SimHasher, **kwargs
+) -> tuple[np.ndarray, np.ndarray]:
+    """Worker side of _chunk_signatures for a whole shard of unknown length: append its rows to rows_path."""
+    with open(rows_path, "wb") as out:
+        return _chunk_signatures(path, 0, None, out, hasher, ngrams_path=ngrams_path, **kwargs)
+
+
+def _compute_signatures(
+    input_paths: list[os.PathLike],
+    hasher: MinHasher | SimHasher,
+    executor: concurrent.futures.Executor,
+    work_dir: str | None,
+    timer: _StageTimer,
+    ngrams_dir: str | None = None,
+    **kwargs,
+) -> tuple[np.ndarray, np.ndarray, list[int]]:
+    """
+    Signature matrix (num_docs, hasher.num_hashes) of hasher.dtype with
+    document ids assigned in input order, plus the number of distinct n-grams of every document and the
+    documents per file. With a work_dir, chunks of documents are signed by the
+    executor's workers, which write rows directly into a memory-mapped matrix
+    there, so the result does not depend on the number of workers and no
+    signatures are pickled back.
+
+    Compressed shards are not counted ahead: each is signed first, in a single
+    decompressing pass, into a file of its own rows (in memory without a
+    work_dir), which is copied into the matrix once every document count is known.
+
+    With an ngrams_dir, the n-gram hash sets are cached in
+    ngrams_dir/ngrams.bin (see `_load_ngram_sets`). The time of every
+    SIGNATURE_STAGES stage, summed over the chunks, is added to timer.
+    """
+    doc_mode = kwargs["doc_mode"]
+    file_chunks = list(
+        executor.map(_document_chunks, input_paths, [doc_mode] * len(input_paths), [CHUNK_DOCS] * len(input_paths))
+    )
+    tasks = [
+        (file, path, offset, num_docs)
+        for file, (path, chunks) in enumerate(zip(input_paths, file_chunks))
+        for offset, num_docs in chunks
+    ]
+    ngrams_paths = [_ngrams_chunk_path(ngrams_dir, task) if ngrams_dir else None for task in range(len(tasks))]
+
+    # compressed shards are signed first, as their length is only known once they are read
+    streamed = [task for task, (_, _, _, num_docs) in enumerate(tasks) if num_docs is None]
+    streamed_paths = [tasks[task][1] for task in streamed]
+    streamed_ngrams_paths = [ngrams_paths[task] for task in streamed]
+    if work_dir is not None:
+        streamed_rows = [os.path.join(work_dir, f"rows{task:08d}.bin") for task in streamed]
+        stream = functools.partial(_stream_signatures_to_file, hasher=hasher, **kwargs)
+        streamed_results = list(executor.map(stream, streamed_paths, streamed_rows, streamed_ngrams_paths))
+    else:
+        streamed_rows = [io.BytesIO() for _ in streamed]
+        streamed_results = [
+            _chunk_signatures(path, 0, None, out, hasher, ngrams_path=ngrams_path, **kwargs)
+            for path, out, ngrams_path in zip(streamed_paths, streamed_rows, streamed_ngrams_paths)
+        ]
+    results = dict(zip(streamed, streamed_results))
+    chunk_docs = [len(results[task][0]) if n is None else n for task, (_, _, _, n) in enumerate(tasks)]
+    row_starts = np.cumsum([0] + chunk_docs)[:-1].tolist()
+    files = [file for file, _, _, _ in tasks]
+    docs_per_file = np.bincount(files, weights=chunk_docs, minlength=len(input_paths)).astype(np.int64).tolist()
+    num_docs = sum(chunk_docs)
+
+    if work_dir is not None and num_docs:
+        signatures_path = os.path.join(work_dir, "signatures.bin")
+        signatures = np.memmap(signatures_path, dtype=hasher.dtype, mode="w+", shape=(num_docs, hasher.num_hashes))
+    else:
+        signatures = np.empty((num_docs, hasher.num_hashes), dtype=hasher.dtype)
+    for task, rows in zip(streamed, streamed_rows):
+        _copy_rows(rows, signatures[row_starts[task]:row_starts[task] + chunk_docs[task]])
+
+    chunked = [task for task, (_, _, _, num_docs) in enumerate(tasks) if num_docs is not None]
+    columns = (
+        [tasks[task][1] for task in chunked],
+        [tasks[task][2] for task in chunked],
+        [chunk_docs[task] for task in chunked],
+        [row_starts[task] for task in chunked],
+        [ngrams_paths[task] for task in chunked],
+    )
+    if isinstance(signatures, np.memmap):
+        sign = functools.partial(_chunk_signatures_to_file, signatures_path=signatures_path, hasher=hasher, **kwargs)
+        chunk_results = executor.map(sign, *columns)
+    else:
+        chunk_results = [
+            _chunk_signatures(path, offset, n, signatures[start:start + n], hasher, ngrams_path=ngrams_path, **kwargs)
+            for path, offset, n, start, ngrams_path in zip(*columns)
+        ]
+    results.update(zip(chunked, chunk_results))
+    results = [results[task] for task in range(len(tasks))]
+    num_ngrams = np.concatenate([n for n, _ in results]) if results else np.zeros(0, dtype=np.int64)
+    stage_seconds = np.sum([seconds for _, seconds in results], axis=0) if results else np.zeros(3)
+    for stage, seconds in zip(SIGNATURE_STAGES, stage_seconds.tolist()):
+        timer.add(stage, seconds)
+
+    if ngrams_dir is not None:
+        # tasks are in doc order, so their concatenation holds the sets of docs 0, 1, ...
+        with open(os.path.join(ngrams_dir, "ngrams.bin"), "wb") as fout:
+            for chunk_path in ngrams_paths:
+                with open(chunk_path, "rb") as fin:
+                    shutil.copyfileobj(fin, fout)
+                os.remove(chunk_path)
+    return signatures, num_ngrams, docs_per_file
+
+
+def _copy_rows(rows: str | io.BytesIO, out: np.ndarray) -> None:
+    """Copy the signature rows of a streamed shard, a file that is removed afterwards or a buffer, into out."""
+    if isinstance(rows, io.BytesIO):
+        out[:] = np.frombuffer(rows.getvalue(), dtype=out.dtype).reshape(out.shape)
+        return
+    if len(out):
+        rows_file = np.memmap(rows, dtype=out.dtype, mode="r", shape=out.shape)
+        for start in range(0, len(out), CHUNK_DOCS):
+            out[start:start + CHUNK_DOCS] = rows_file[start:start + CHUNK_DOCS]
+        del rows_file
+    os.remove(rows)
+
+
+def _load_ngram_sets(ngrams_dir: str, num_ngrams: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """The cached n-gram hashes (memory-mapped) and offsets: doc i's set is ngrams[offsets[i]:offsets[i + 1]]."""
+    offsets = np.r_[0, np.cumsum(num_ngrams)].astype(np.int64)
+    if offsets[-1] == 0:
+        return np.zeros(0, dtype=np.uint64), offsets
+    return np.memmap(os.path.join(ngrams_dir, "ngrams.bin"), dtype=np.uint64, mode="r"), offsets
+
+
+def _exact_jaccard(pairs: np.ndarray, ngrams: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Jaccard similarity of the sorted n-gram hash sets of every pair of documents."""
+    similarity = np.zeros(len(pairs))
+    for i, (d1, d2) in enumerate(pairs.tolist()):
+        a = ngrams[offsets[d1]:offsets[d1 + 1]]
+        b = ngrams[offsets[d2]:offsets[d2 + 1]]
+        common = len(np.intersect1d(a, b, assume_unique=True))
+        similarity[i] = common / (len(a) + len(b) - common)
+    return similarity
+
+
 def fuzzy_deduplicate(
     input_paths: list[os.PathLike],
     num_hashes: int,
@@ -86,68 +746,243 @@ def fuzzy_deduplicate(
     ngram_size: int,
     jaccard_threshold: float,
     output_dir: os.PathLike,
-):
-    assert num_hashes % num_bands == 0
-    rows_per_band = num_hashes // num_bands
+    doc_mode: str = "file",
+    text_key: str = "text",
+    num_workers: int = 1,
+    tmp_dir: os.PathLike | None = None,
+    memory_limit: int | None = None,
+    max_bucket_size: int = MAX_BUCKET_SIZE,
+    exact_jaccard: bool = False,
+    index_path: os.PathLike | None = None,
+    representative: str = "first",
+    engine: str = "minhash",
+    max_hamming_distance: int = 3,
+    num_blocks: int = 6,
+    report_path: os.PathLike | None = None,
+) -> dict:
+    """
+    Near-duplicate removal with MinHash LSH (or SimHash, see below), keeping
+    one document per cluster: the first one (smallest document id) with
+    representative="first", the one with the most distinct n-grams with
+    "longest".
+
+    doc_mode="file" treats every input file as one document and copies the
+    retained files. With "line" (one document per line) or "jsonl" (the
+    `text_key` field of one JSON record per line) documents are clustered
+    across all shards and every shard is rewritten with only its retained
+    lines. Only the signature matrix is held in memory, never the text.
+    Documents too short to have an n-gram are never treated as duplicates.
+    Shards ending in .gz, .bz2, .xz or .zst are read and rewritten compressed,
+    streaming; each one is signed as a single chunk since it cannot be seeked.
+
+    With num_workers > 1 or a memory_limit (in bytes), signatures go to a
+    memory-mapped matrix under tmp_dir and LSH banding runs out of core on
+    partitions sized to memory_limit, signed and grouped by a process pool.
+    The output does not depend on the number of workers or the memory limit.
+
+    Candidate pairs are verified once however many bands they share. LSH
+    buckets larger than max_bucket_size only pair their members with the
+    bucket's first document.
+
+    By default a pair matches when the fraction of agreeing signature values
+    exceeds jaccard_threshold. exact_jaccard=True instead compares the true
+    Jaccard similarity of the pair's hashed n-gram sets, which are cached on
+    disk under tmp_dir while signing; signatures then only select candidates,
+    so fewer hashes suffice.
+
+    With an index_path, documents kept by this run are also checked against a
+    persistent `MinHashLSHIndex` there (by signature agreement) and dropped if
+    they match; the remaining ones are added to it. Successive crawls
+    deduplicated with the same index_path, num_hashes, num_bands and
+    ngram_size are thereby deduplicated against everything kept before.
+
+    engine="simhash" replaces the MinHash signatures by one 64-bit SimHash
+    fingerprint per document (see cs336_data.simhash): documents match when
+    their fingerprints differ in at most max_hamming_distance bits, found with
+    permuted tables over num_blocks blocks. num_hashes, num_bands and
+    jaccard_threshold are then unused unless exact_jaccard is set, in which
+    case pairs are still accepted on their true Jaccard similarity.
+
+    Returns a report, also written as JSON to report_path if given: document
+    and byte counts, LSH bucket and cluster size histograms (the number of
+    buckets or clusters with a size in [2^i, 2^(i + 1))), candidate pairs
+    generated, checked and matched, and the seconds spent per stage. "read",
+    "normalize" and "signature" are summed over the signing tasks, the others
+    ("signing", "banding", "verify", "cluster", "index", "write") are wall time.
+    """
+    assert doc_mode in DOC_MODES
+    assert representative in REPRESENTATIVES
+    assert engine in ENGINES
     seed = 42
-    random.seed(seed)
+    if engine == "simhash":
+        assert index_path is None, "the persistent index holds MinHash signatures"
+        hasher = SimHasher()
+        num_bands = math.comb(num_blocks, max_hamming_distance)
+        key_fn = functools.partial(table_keys, num_blocks=num_blocks, max_distance=max_hamming_distance)
+    else:
+        assert num_hashes % num_bands == 0
+        hasher = MinHasher(num_hashes, seed=seed)
+        key_fn = None
     os.makedirs(output_dir, exist_ok=True)
-    buckets = collections.defaultdict(list)
-    total = []
-
-    for idx, path in enumerate(input_paths):
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            docs = [line.rstrip("\n") for line in f]
-
-        normalized = [normalize_text(d) for d in docs]
-        normalized = ' '.join(normalized)
-        ngram_sets = word_ngrams(normalized, ngram_size)
-        # compute minhash for each document
-        signatures = minhash_signature(ngram_sets, num_hashes)
-        total.append(signatures)
-        for b in range(num_bands):
-            start = b * rows_per_band
-            end = start + rows_per_band
-            band_sig = tuple(signatures[start:end])
-            bucket_id = (b, band_sig)
-            buckets[bucket_id].append(idx)
-
-    parent = list(range(len(input_paths)))
-
-    def find(x):
-        while parent[x] != x:
-            parent[x] = parent[parent[x]]
-            x = parent[x]
-        return x
-
-    def union(a, b):
-        ra, rb = find(a), find(b)
-        if ra != rb:
-            parent[rb] = ra
-
-    # Candidate comparison
-    for bucket_docs in buckets.values():
-        if len(bucket_docs) < 2:
-            continue
-        for i in range(len(bucket_docs)):
-            for j in range(i + 1, len(bucket_docs)):
-                d1, d2 = bucket_docs[i], bucket_docs[j]
-                count = sum([1 for ta, tb in zip(total[d1], total[d2]) if ta == tb])
-                jaccard = count / len(total[d1])
-                if jaccard > jaccard_threshold:
-                    union(d1, d2)
-
-    clusters = collections.defaultdict(list)
-    for i in range(len(input_paths)):
-        clusters[find(i)].append(i)
-
-    retained = set()
-    for cluster_docs in clusters.values():
-        retained.add(random.choice(cluster_docs))
-
-    for idx in retained:
-        input_path = input_paths[idx]
+    in_memory = memory_limit is None and num_workers == 1
+    timer = _StageTimer()
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp, _executor(num_workers) as executor:
+        work_dir = None if in_memory else tmp
+        signatures, num_ngrams, docs_per_file = _compute_signatures(
+            input_paths,
+            hasher,
+            executor,
+            work_dir,
+            timer,
+            doc_mode=doc_mode,
+            text_key=text_key,
+            ngram_size=ngram_size,
+            ngrams_dir=tmp if exact_jaccard else None,
+        )
+        timer.stop("signing")
+        ngram_sets = _load_ngram_sets(tmp, num_ngrams) if exact_jaccard else None
+        stats = {}
+        candidates = iter_candidate_pairs(
+            signatures,
+            num_ngrams > 0,
+            num_bands,
+            work_dir,
+            memory_limit,
+            num_workers,
+            executor,
+            max_bucket_size,
+            stats,
+            key_fn,
+        )
+        if ngram_sets is not None:
+            is_match = functools.partial(_exact_jaccard_match, ngram_sets=ngram_sets, threshold=jaccard_threshold)
+        elif engine == "simhash":
+            is_match = functools.partial(_hamming_match, signatures=signatures, max_distance=max_hamming_distance)
+        else:
+            is_match = functools.partial(_signature_match, signatures=signatures, threshold=jaccard_threshold)
+        cluster_id = _cluster_documents(len(signatures), candidates, is_match, stats, timer)
+        del is_match
+        retained = cluster_representatives(cluster_id, num_ngrams if representative == "longest" else None)
+        if index_path is not None:
+            _deduplicate_against_index(
+                index_path, signatures, num_ngrams > 0, retained, num_bands, jaccard_threshold, stats
+            )
+            timer.stop("index")
+        # release the memmaps before their directory is removed
+        del signatures, ngram_sets
+    output_paths = _write_retained_documents(input_paths, docs_per_file, retained, output_dir, doc_mode)
+    timer.stop("write")
+
+    num_docs = len(retained)
+    num_retained = int(np.count_nonzero(retained))
+    cluster_sizes = np.bincount(cluster_id)
+    report = {
+        "input_docs": num_docs,
+        "output_docs": num_retained,
+        "duplicate_docs": num_docs - num_retained,
+        "duplicate_ratio": (num_docs - num_retained) / max(num_docs, 1),
+        **_byte_counts(input_paths, output_paths),
+        **stats,
+        "bucket_size_histogram": stats.get("bucket_size_histogram", np.zeros(0, dtype=np.int64)).tolist(),
+        "cluster_size_histogram": bucket_size_histogram(cluster_sizes[cluster_sizes > 0]).tolist(),
+        "seconds": timer.seconds(),
+    }
+    _write_report(report, report_path)
+    return report
+
+
+def _signature_match(pairs: np.ndarray, signatures: np.ndarray, threshold: float) -> np.ndarray:
+    agree = np.count_nonzero(signatures[pairs[:, 0]] == signatures[pairs[:, 1]], axis=1)
+    return agree / signatures.shape[1] > threshold
+
+
+def _hamming_match(pairs: np.ndarray, signatures: np.ndarray, max_distance: int) -> np.ndarray:
+    return hamming_distance(signatures[pairs[:, 0], 0], signatures[pairs[:, 1], 0]) <= max_distance
+
+
+def _exact_jaccard_match(pairs: np.ndarray, ngram_sets: tuple[np.ndarray, np.ndarray], threshold: float) -> np.ndarray:
+    return _exact_jaccard(pairs, *ngram_sets) > threshold
+
+
+def _cluster_documents(
+    num_docs: int,
+    candidates: Iterable[np.ndarray],
+    is_match: Callable[[np.ndarray], np.ndarray],
+    stats: dict,
+    timer: _StageTimer,
+) -> np.ndarray:
+    """
+    Cluster id of every document: connected components over the candidate pairs
+    that is_match accepts. Counts the pairs checked and matched into stats, and
+    times producing the candidates ("banding"), checking them ("verify") and
+    clustering ("cluster").
+    """
+    # every count and stage is reported, even without any candidate pair
+    stats["pairs_checked"] = stats["pairs_matched"] = 0
+    for stage in ("banding", "verify"):
+        timer.add(stage, 0.0)
+    edges = [np.zeros((0, 2), dtype=np.int64)]
+    for pairs in candidates:
+        timer.stop("banding")
+        for start in range(0, len(pairs), VERIFY_BATCH):
+            batch = pairs[start:start + VERIFY_BATCH]
+            matched = batch[is_match(batch)]
+            stats["pairs_checked"] += len(batch)
+            stats["pairs_matched"] += len(matched)
+            edges.append(matched)
+        timer.stop("verify")
+    timer.stop("banding")
+    cluster_id = connected_components(num_docs, np.concatenate(edges))
+    timer.stop("cluster")
+    return cluster_id
+
+
+def _deduplicate_against_index(
+    index_path: os.PathLike,
+    signatures: np.ndarray,
+    has_ngrams: np.ndarray,
+    retained: np.ndarray,
+    num_bands: int,
+    jaccard_threshold: float,
+    stats: dict,
+) -> None:
+    """Drop the retained documents that match the index at index_path, then add the others to it."""
+    num_hashes = signatures.shape[1]
+    if os.path.exists(os.path.join(index_path, "meta.json")):
+        index = MinHashLSHIndex.load(index_path)
+        assert (index.num_hashes, index.num_bands) == (num_hashes, num_bands), "index built with other LSH parameters"
+    else:
+        index = MinHashLSHIndex(num_hashes, num_bands)
+    docs = np.flatnonzero(retained & has_ngrams)
+    seen = np.zeros(len(docs), dtype=bool)
+    for start in range(0, len(docs), VERIFY_BATCH):
+        matches = index.query_batch(signatures[docs[start:start + VERIFY_BATCH]], jaccard_threshold)
+        seen[start:start + len(matches)] = [len(doc_ids) > 0 for doc_ids in matches]
+    retained[docs[seen]] = False
+    stats["index_matches"] = int(np.count_nonzero(seen))
+    new_docs = docs[~seen]
+    index.insert_batch(len(index) + np.arange(len(new_docs)), signatures[new_docs])
+    index.save(index_path)
+
+
+def _write_retained_documents(
+    input_paths: list[os.PathLike],
+    docs_per_file: list[int],
+    retained: np.ndarray,
+    output_dir: os.PathLike,
+    doc_mode: str,
+) -> list[str]:
+    """Rewrite every input into output_dir with only its retained documents, return the files written."""
+    output_paths = []
+    doc_offsets = np.cumsum([0] + docs_per_file)
+    for input_path, first_doc, end_doc in zip(input_paths, doc_offsets[:-1], doc_offsets[1:]):
         output_path = os.path.join(output_dir, os.path.basename(input_path))
-        with open(input_path, "r", encoding="utf-8", errors="replace") as fin, \
-            open(output_path, "w", encoding="utf-8") as fout:
-                fout.writelines(fin)
+        if doc_mode == "file":
+            if retained[first_doc]:
+                shutil.copyfile(input_path, output_path)
+                output_paths.append(output_path)
+            continue
+        with _open(input_path, "rb") as fin, _open(output_path, "wb") as fout:
+            fout.writelines(itertools.compress(fin, retained[first_doc:end_doc]))
+        output_paths.append(output_path)
+    return output_paths
@@ -65,7 +65,10 @@ from resiliparse.extract.html2text import extract_plain_text
 from resiliparse.parse.encoding import detect_encoding
 import fasttext
 
+from cs336_data.profiling import timed
 
+
+@timed
 def extract_text(html_bytes: bytes) -> str | None:
     try:
         encoding = detect_encoding(html_bytes)
@@ -132,6 +135,7 @@ suitable claissifier confidence thresthold should be 0.7 based on the 20 files
 ('zh', 0.964841902256012)
 """
 
+@timed
 def get_language(text: str) -> tuple[Any, float]:
     text = " ".join(text.split())
     model = fasttext.load_model("/Users/YangWen/Documents/Code/github/data/data/classifier/lid.176.bin")
@@ -172,6 +176,7 @@ EMAIL_PATTERN = re.compile(
     re.VERBOSE
 )
 
+@timed
 def mask_email(text: str) -> tuple[str, int]:
     return EMAIL_PATTERN.subn("|||EMAIL_ADDRESS|||", text)
 
@@ -193,6 +198,7 @@ PHONE_PATTERN = re.compile(
 )
 
 
+@timed
 def mask_phone_numbers(text: str) -> tuple[str, int]:
     return PHONE_PATTERN.subn("|||PHONE_NUMBER|||", text)
 
@@ -211,6 +217,7 @@ IPV4_PATTERN = re.compile(
 )
 
 
+@timed
 def mask_ips(text: str) -> tuple[str, int]:
     return IPV4_PATTERN.subn("|||IP_ADDRESS|||", text)
 
@@ -267,6 +274,7 @@ def has_alpha(word: str) -> bool:
     return any(c.isalpha() for c in word)
 
 
+@timed
 def gopher_quality_filter(text: str) -> bool:
     """
     Returns True if the document passes all filters,
@@ -1,3 +1,4 @@
+import argparse
 import concurrent.futures
 import multiprocessing
 import os
@@ -5,6 +6,8 @@ import re
 from tqdm import tqdm
 
 import numpy as np
+from cs336_data import profiling
+from cs336_data.profiling import timed
 from cs336_data.training import get_text_from_wet
 from transformers import AutoTokenizer
 
@@ -29,9 +32,13 @@ need to add deduplicateds in the model
 tokenize_data
 1 wet file 30k tokens
 5000 WET, should give 150M tokens in total
+
+the per-file and per-function breakdown can be reproduced with
+uv run python -m cs336_data.filter --profile
 """
 
 
+@timed
 def process_single_wet_file(wet_path: str, output_dir: str, lang="en") -> str:
     assert wet_path.endswith(".wet.gz")
     ans = get_text_from_wet(wet_path, 2000)
@@ -54,7 +61,7 @@ def filter_wet_directory(output_dir: str) -> None:
     ]
     os.makedirs(output_dir, exist_ok=True)
     num_cpus = os.cpu_count()
-    executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_cpus)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_cpus, initializer=profiling.worker_init)
     futures = []
     for wet_filepath in wet_filepaths:
         # For each warc.wet.gz filepath, submit a job to the executor and get a future back
@@ -73,8 +80,11 @@ def filter_wet_directory(output_dir: str) -> None:
     ):
         output_file = future.result()
         print(f"Output file written: {output_file}")
+    # workers write their profiling dumps on exit
+    executor.shutdown()
 
 
+@timed
 def tokenize_line_and_add_eos(line):
     tokenizer = AutoTokenizer.from_pretrained("gpt2")
     return tokenizer.encode(line) + [tokenizer.eos_token_id]
@@ -83,7 +93,7 @@ def tokenize_line_and_add_eos(line):
 def tokenize(input_path: str, output_path: str):
     with open(input_path) as f:
         lines = f.readlines()
-    pool = multiprocessing.Pool(multiprocessing.cpu_count())
+    pool = multiprocessing.Pool(multiprocessing.cpu_count(), initializer=profiling.worker_init)
     chunksize = 100
     results = []
     for result in tqdm(
@@ -104,6 +114,14 @@ def tokenize(input_path: str, output_path: str):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", action="store_true", help="time the hot functions of the pipeline")
+    parser.add_argument("--profile-sample-rate", type=float, default=None, help="fraction of workers to run cProfile in")
+    parser.add_argument("--profile-dir", default=None)
+    args = parser.parse_args()
+    if args.profile or profiling.is_enabled():
+        profiling.enable(sample_rate=args.profile_sample_rate, profile_dir=args.profile_dir)
+
     filter_wet_directory(
         output_dir="/Users/YangWen/Documents/Code/github/data/data/output/",
     )
@@ -111,3 +129,5 @@ if __name__ == "__main__":
         input_path="/Users/YangWen/Documents/Code/github/data/data/output/CC-MAIN-20250417135010-20250417165010-00065.warc.wet.txt",
         output_path="/Users/YangWen/Documents/Code/github/data/data/output/CC-MAIN-20250417135010-20250417165010-00065.warc.wet.npy"
     )
+    if profiling.is_enabled():
+        print(profiling.format_timings(profiling.collect()))
@@ -0,0 +1,225 @@
+"""
+Compact hashing helpers shared by the dedup tools.
+
+Lines are hashed to 64-bit integers with murmur3. With 64-bit keys the chance
+of any collision is about n^2 / 2^65, i.e. a few percent for a billion distinct
+lines, and a collision can only make us drop a line that was unique.
+"""
+from collections.abc import Iterable
+import json
+import os
+
+import mmh3
+import numpy as np
+
+MAX_COUNT = 2  # counts saturate: we only need "seen once" vs "seen more than once"
+ROLLING_BASE = np.uint64(0x100000001B3)
+ROLLING_BASE_INVERSE = np.uint64(pow(0x100000001B3, -1, 1 << 64))
+# longer windows are hashed from prefix sums instead of one pass per window position
+PREFIX_HASH_MIN_N = 8
+# spilled records are partitioned on at most this many leading hash bits
+MAX_PARTITION_BITS = 8
+# sorting a partition needs the records, the argsort and the sorted copies at once
+SORT_OVERHEAD = 3
+# number of set bits of every byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hash_lines(lines: Iterable[str], count: int = -1) -> np.ndarray:
+    """Hash each line (without its trailing newline) into a uint64 array."""
+    return np.fromiter((mmh3.hash64(line.rstrip("\n"), signed=False)[0] for line in lines), dtype=np.uint64, count=count)
+
+
+def mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, spreads the bits of combined hashes (wraps mod 2^64)."""
+    x = np.asarray(x, dtype=np.uint64)
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def rolling_hash(values: np.ndarray, n: int) -> np.ndarray:
+    """
+    Hash of every window of n consecutive values, as the polynomial
+    sum(values[i + k] * B^(n - 1 - k)) mod 2^64 followed by mix64.
+    Returns len(values) - n + 1 hashes (none if there are fewer than n values).
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    num_windows = len(values) - n + 1
+    if num_windows <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    if n > PREFIX_HASH_MIN_N:
+        return mix64(_prefix_window_sums(values, n))
+    h = values[:num_windows].copy()
+    for k in range(1, n):
+        h *= ROLLING_BASE
+        h += values[k:k + num_windows]
+    return mix64(h)
+
+
+def _prefix_window_sums(values: np.ndarray, n: int) -> np.ndarray:
+    """
+    The same window polynomials in a constant number of passes: with
+    C[j] = sum(values[m] * B^-m for m < j) (B is odd, so invertible mod 2^64),
+    window i is (C[i + n] - C[i]) * B^(i + n - 1).
+    """
+    # uint64 products and sums wrap around, which is the arithmetic mod 2^64 we want
+    powers = np.cumprod(np.full(len(values), ROLLING_BASE, dtype=np.uint64))  # B^1 .. B^len
+    inverse_powers = np.cumprod(np.full(len(values), ROLLING_BASE_INVERSE, dtype=np.uint64))
+    prefix = np.zeros(len(values) + 1, dtype=np.uint64)
+    # values[m] * B^-m, where B^-0 = 1
+    np.cumsum(values * np.r_[np.uint64(1), inverse_powers[:-1]], out=prefix[1:])
+    num_windows = len(values) - n + 1
+    # B^(i + n - 1) for window i, n >= 2
+    return (prefix[n:] - prefix[:num_windows]) * powers[n - 2:n - 2 + num_windows]
+
+
+def sorted_contains(sorted_keys: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+    """Membership of every hash in an ascending key array (which may be a memmap)."""
+    if len(sorted_keys) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+    idx = np.minimum(np.searchsorted(sorted_keys, hashes), len(sorted_keys) - 1)
+    return sorted_keys[idx] == hashes
+
+
+def split_by_prefix(keys: np.ndarray, prefix_bits: int, bits: int) -> np.ndarray:
+    """Boundaries of the 2**bits sub-ranges of sorted keys after the first prefix_bits bits."""
+    if bits == 0:
+        return np.array([0, len(keys)])
+    ids = (keys << np.uint64(prefix_bits)) >> np.uint64(64 - bits) if prefix_bits else keys >> np.uint64(64 - bits)
+    return np.searchsorted(ids, np.arange((1 << bits) + 1, dtype=np.uint64))
+
+
+def read_records(path: str, start: int, end: int, dtype: np.dtype) -> np.ndarray:
+    """Records start to end of a spill file of dtype records."""
+    return np.fromfile(path, dtype=dtype, count=end - start, offset=start * dtype.itemsize)
+
+
+class HashCounter:
+    """
+    Open-addressing hash table from 64-bit hashes to saturating counts.
+
+    Keys live in a uint64 array and counts in a uint8 array (0 marks an empty
+    slot), so an entry costs 9 bytes per slot instead of the ~100 bytes of a
+    hex-string key in a dict. Inserts and lookups take whole NumPy batches and
+    resolve linear probing for the batch at once.
+
+    A counter can be saved to a directory and loaded back memory-mapped, which
+    makes it a persistent line-hash store: a new crawl only pages in the slots
+    it touches, and inserts go straight into the mapped file unless the table
+    has to grow.
+    """
+
+    max_load = 0.7
+
+    def __init__(self, capacity: int = 1 << 16):
+        size = 1 << max(4, int(np.ceil(np.log2(max(capacity, 1) / self.max_load))))
+        self.keys = np.zeros(size, dtype=np.uint64)
+        self.counts = np.zeros(size, dtype=np.uint8)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def capacity(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.counts.nbytes
+
+    def add(self, hashes: np.ndarray) -> None:
+        """Count every hash in the batch (duplicates within the batch included)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if hashes.size == 0:
+            return
+        keys, increments = np.unique(hashes, return_counts=True)
+        self.add_counts(keys, increments)
+
+    def add_counts(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        """Add `counts` to distinct `keys`."""
+        if len(keys) == 0:
+            return
+        if self.size + len(keys) > self.capacity * self.max_load:
+            self._grow(self.size + len(keys))
+        self._insert(np.asarray(keys, dtype=np.uint64), np.minimum(counts, MAX_COUNT).astype(np.uint8))
+
+    def merge(self, other: "HashCounter") -> None:
+        occupied = other.counts != 0
+        self.add_counts(other.keys[occupied], other.counts[occupied])
+
+    def get(self, hashes: np.ndarray) -> np.ndarray:
+        """Return the (saturated) count of every hash in the batch, 0 if never seen."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        mask = np.uint64(self.capacity - 1)
+        result = np.zeros(len(hashes), dtype=np.uint8)
+        pending = np.arange(len(hashes))
+        slots = (hashes & mask).astype(np.int64)
+        while pending.size:
+            slot_counts = self.counts[slots]
+            hit = (slot_counts != 0) & (self.keys[slots] == hashes[pending])
+            result[pending[hit]] = slot_counts[hit]
+            more = (slot_counts != 0) & ~hit
+            pending = pending[more]
+            slots = (slots[more] + 1) & (self.capacity - 1)
+        return result
+
+    def _insert(self, keys: np.ndarray, increments: np.ndarray) -> None:
+        # keys must be unique within the batch
+        capacity_mask = self.capacity - 1
+        pending = np.arange(len(keys))
+        slots = (keys & np.uint64(capacity_mask)).astype(np.int64)
+        while pending.size:
+            slot_counts = self.counts[slots]
+            hit = (slot_counts != 0) & (self.keys[slots] == keys[pending])
+            if hit.any():
+                hit_slots = slots[hit]
+                self.counts[hit_slots] = np.minimum(self.counts[hit_slots] + increments[pending[hit]], MAX_COUNT)
+            # several new keys can probe the same empty slot in one round, the first one claims it
+            empty = np.flatnonzero(slot_counts == 0)
+            _, first = np.unique(slots[empty], return_index=True)
+            claimed = empty[first]
+            self.keys[slots[claimed]] = keys[pending[claimed]]
+            self.counts[slots[claimed]] = increments[pending[claimed]]
+            self.size += len(claimed)
+
+            more = ~hit
+            more[claimed] = False
+            pending = pending[more]
+            slots = (slots[more] + 1) & capacity_mask
+
+    def _grow(self, min_size: int) -> None:
+        occupied = self.counts != 0
+        keys, counts = self.keys[occupied], self.counts[occupied]
+        capacity = self.capacity
+        while min_size > capacity * self.max_load:
+            capacity *= 2
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.counts = np.zeros(capacity, dtype=np.uint8)
+        self.size = 0
+        self._insert(keys, counts)
+
+    def save(self, directory: os.PathLike) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name in ("keys", "counts"):
+            array = getattr(self, name)
+            path = os.path.abspath(os.path.join(directory, f"{name}.npy"))
+            if isinstance(array, np.memmap) and array.filename == path:
+                # loaded from here and updated in place
+                array.flush()
+            else:
+                np.save(path, array)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"size": self.size}, f)
+
+    @classmethod
+    def load(cls, directory: os.PathLike, mmap_mode: str | None = "r+") -> "HashCounter":
+        counter = cls.__new__(cls)
+        counter.keys = np.load(os.path.join(directory, "keys.npy"), mmap_mode=mmap_mode)
+        counter.counts = np.load(os.path.join(directory, "counts.npy"), mmap_mode=mmap_mode)
+        with open(os.path.join(directory, "meta.json")) as f:
+            counter.size = json.load(f)["size"]
+        return counter
@@ -0,0 +1,604 @@
+"""
+Locality-sensitive hashing over MinHash signature matrices.
+
+Every band of rows_per_band signature values is hashed to 64 bits, with the
+band index mixed in so that one key space serves all bands. Documents that
+share a band hash are candidate duplicates.
+
+When the (band hash, doc id) records of a corpus do not fit in memory they are
+spilled into partition files on the top bits of the band hash, and every
+partition is grouped on its own (in a process pool when given one), its pairs
+generated a batch of buckets at a time. Peak memory is then bounded by one
+partition and one batch of pairs, and candidate pairs come back as a stream of
+arrays, one per range of doc ids.
+"""
+from collections.abc import Callable, Iterator
+import concurrent.futures
+import functools
+import json
+import math
+import os
+
+import numpy as np
+
+from cs336_data.hashing import MAX_PARTITION_BITS, ROLLING_BASE, SORT_OVERHEAD, mix64, read_records, split_by_prefix
+
+BAND_RECORD = np.dtype([("hash", "<u8"), ("doc", "<u4")])
+PAIR_DTYPE = np.uint32
+# signature rows band-hashed and spilled per task
+SPILL_ROWS = 1 << 16
+# buckets with more documents are linked to their first document instead of paired all-to-all
+MAX_BUCKET_SIZE = 1000
+
+
+def band_hashes(signatures: np.ndarray, num_bands: int) -> np.ndarray:
+    """(num_docs, num_bands) uint64 hash of every band of every signature."""
+    num_docs, num_hashes = signatures.shape
+    assert num_hashes % num_bands == 0
+    bands = np.asarray(signatures, dtype=np.uint64).reshape(num_docs, num_bands, num_hashes // num_bands)
+    h = np.broadcast_to(np.arange(num_bands, dtype=np.uint64), (num_docs, num_bands)).copy()
+    for row in range(bands.shape[2]):
+        h *= ROLLING_BASE
+        h += bands[:, :, row]
+    return mix64(h)
+
+
+def band_records(
+    signatures: np.ndarray,
+    num_bands: int,
+    has_ngrams: np.ndarray,
+    row_start: int = 0,
+    key_fn: Callable[[np.ndarray], np.ndarray] | None = None,
+) -> np.ndarray:
+    """
+    (band hash, doc id) records of the documents that have an n-gram, sorted by
+    band hash and by doc id within a hash. Row i of signatures is doc row_start + i.
+    key_fn replaces `band_hashes` for other kinds of signatures, mapping them
+    to (num_docs, num_bands) uint64 keys.
+    """
+    key_fn = key_fn or functools.partial(band_hashes, num_bands=num_bands)
+    docs = np.flatnonzero(has_ngrams)
+    records = np.empty((len(docs), num_bands), dtype=BAND_RECORD)
+    records["hash"] = key_fn(signatures[docs])
+    records["doc"] = (docs + row_start)[:, None]
+    records = records.ravel()
+    return records[np.argsort(records["hash"], kind="stable")]
+
+
+def bucket_size_histogram(sizes: np.ndarray) -> np.ndarray:
+    """Number of buckets with a size in [2^i, 2^(i + 1)) for every i."""
+    return np.bincount(np.log2(sizes).astype(np.int64)) if len(sizes) else np.zeros(0, dtype=np.int64)
+
+
+def bucket_pairs(records: np.ndarray, max_bucket_size: int = MAX_BUCKET_SIZE) -> tuple[np.ndarray, dict]:
+    """
+    Candidate pairs of documents sharing a band hash as a (num_pairs, 2) array,
+    the smaller doc id first, plus bucket statistics. Records must be sorted as
+    `band_records` returns them.
+
+    A bucket of at most max_bucket_size documents yields all of its pairs. A
+    larger one (typically boilerplate) only pairs every member with its first
+    document, so it costs linear instead of quadratic work.
+    """
+    batches, stats = iter_bucket_pairs(records, max_bucket_size)
+    return np.concatenate([np.zeros((0, 2), dtype=PAIR_DTYPE), *batches]), stats
+
+
+def iter_bucket_pairs(
+    records: np.ndarray, max_bucket_size: int = MAX_BUCKET_SIZE, max_pairs: int | None = None
+) -> tuple[Iterator[np.ndarray], dict]:
+    """
+    The pairs of `bucket_pairs` as a lazy stream of arrays, each holding the
+    pairs of whole buckets and at most max_pairs of them unless one bucket has
+    more, so that only one batch is materialized at a time. The bucket
+    statistics are complete before the first batch.
+    """
+    hashes = records["hash"]
+    starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]]) if len(hashes) else np.zeros(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(hashes)])
+    giant = sizes > max_bucket_size
+    num_pairs = np.where(giant, sizes - 1, sizes * (sizes - 1) // 2)
+    stats = {
+        "buckets": len(sizes),
+        "giant_buckets": int(np.count_nonzero(giant)),
+        "bucket_size_histogram": bucket_size_histogram(sizes),
+        "pairs_generated": int(num_pairs.sum()),
+    }
+    return _pair_batches(records["doc"], starts, sizes, giant, num_pairs, max_pairs), stats
+
+
+def _pair_batches(
+    docs: np.ndarray,
+    starts: np.ndarray,
+    sizes: np.ndarray,
+    giant: np.ndarray,
+    num_pairs: np.ndarray,
+    max_pairs: int | None,
+) -> Iterator[np.ndarray]:
+    cumulative_pairs = np.cumsum(num_pairs)
+    first = 0
+    while first < len(sizes):
+        if max_pairs is None:
+            last = len(sizes)
+        else:
+            before = cumulative_pairs[first - 1] if first else 0
+            last = max(int(np.searchsorted(cumulative_pairs, before + max_pairs, side="right")), first + 1)
+        yield _bucket_range_pairs(docs, starts[first:last], sizes[first:last], giant[first:last])
+        first = last
+
+
+def _bucket_range_pairs(docs: np.ndarray, starts: np.ndarray, sizes: np.ndarray, giant: np.ndarray) -> np.ndarray:
+    """Pairs of a run of consecutive buckets."""
+    docs = docs[starts[0]:starts[-1] + sizes[-1]]
+    starts = starts - starts[0]
+    pairs = [np.zeros((0, 2), dtype=docs.dtype)]
+    # pair every record with the one k places further on in the same bucket, for k = 1, 2, ...
+    ends = np.repeat(starts + sizes, sizes)
+    left = np.flatnonzero(np.repeat((sizes > 1) & ~giant, sizes))
+    k = 1
+    while left.size:
+        left = left[left + k < ends[left]]
+        pairs.append(np.stack([docs[left], docs[left + k]], axis=1))
+        k += 1
+    # giant buckets: the leader (smallest doc id) with every other member
+    leaders = np.repeat(starts[giant], sizes[giant])
+    members = np.flatnonzero(np.repeat(giant, sizes))
+    not_leader = members != leaders
+    pairs.append(np.stack([docs[leaders[not_leader]], docs[members[not_leader]]], axis=1))
+    return np.concatenate(pairs).astype(PAIR_DTYPE, copy=False)
+
+
+def unique_pairs(pairs: np.ndarray) -> np.ndarray:
+    """Drop repeated pairs (e.g. from several shared bands), sorted by (left, right)."""
+    return _decode_pairs(np.unique(_encode_pairs(pairs)))
+
+
+def _encode_pairs(pairs: np.ndarray) -> np.ndarray:
+    return (pairs[:, 0].astype(np.uint64) << np.uint64(32)) | pairs[:, 1].astype(np.uint64)
+
+
+def _decode_pairs(keys: np.ndarray) -> np.ndarray:
+    return np.stack([keys >> np.uint64(32), keys & np.uint64(0xFFFFFFFF)], axis=1).astype(PAIR_DTYPE)
+
+
+def merge_stats(total: dict, stats: dict) -> None:
+    """Add bucket statistics into total."""
+    for name, value in stats.items():
+        if name == "bucket_size_histogram":
+            histogram = total.get(name, np.zeros(0, dtype=np.int64))
+            merged = np.zeros(max(len(histogram), len(value)), dtype=np.int64)
+            merged[:len(histogram)] += histogram
+            merged[:len(value)] += value
+            total[name] = merged
+        else:
+            total[name] = total.get(name, 0) + value
+
+
+def _spill_bands(
+    signatures_path: str,
+    dtype: np.dtype,
+    shape: tuple[int, int],
+    row_start: int,
+    has_ngrams: np.ndarray,
+    num_bands: int,
+    key_fn: Callable[[np.ndarray], np.ndarray] | None,
+    bits: int,
+    spill_path: str,
+) -> np.ndarray:
+    """Write the sorted band records of a slice of the signature matrix, return the partition boundaries."""
+    signatures = np.memmap(signatures_path, dtype=dtype, mode="r", shape=shape)
+    signatures = signatures[row_start:row_start + len(has_ngrams)]
+    records = band_records(signatures, num_bands, has_ngrams, row_start, key_fn)
+    records.tofile(spill_path)
+    return split_by_prefix(records["hash"], 0, bits)
+
+
+def _partition_pairs(
+    segments: list[tuple[str, int, int]],
+    doc_bounds: np.ndarray,
+    max_bucket_size: int,
+    max_pairs: int | None,
+    output_path: str,
+) -> tuple[list[np.ndarray], dict]:
+    """
+    Write the distinct pair keys of one band partition to output_path as sorted
+    runs, one per batch of at most max_pairs pairs (see `iter_bucket_pairs`),
+    and return where every doc range (on the left doc id) starts in every run,
+    with the bucket statistics of the partition.
+    """
+    # segments come in doc order, so a stable sort keeps doc ids ascending within a bucket
+    records = [read_records(*segment, BAND_RECORD) for segment in segments]
+    records = np.concatenate(records or [np.zeros(0, BAND_RECORD)])
+    records = records[np.argsort(records["hash"], kind="stable")]
+    batches, stats = iter_bucket_pairs(records, max_bucket_size, max_pairs)
+    run_bounds = []
+    written = 0
+    with open(output_path, "wb") as f:
+        for pairs in batches:
+            keys = np.unique(_encode_pairs(pairs))
+            keys.tofile(f)
+            run_bounds.append(written + np.searchsorted(keys, doc_bounds.astype(np.uint64) << np.uint64(32)))
+            written += len(keys)
+    return run_bounds, stats
+
+
+def _merge_pairs(segments: list[tuple[str, int, int]], output_path: str) -> str:
+    keys = [np.fromfile(path, dtype=np.uint64, count=end - start, offset=start * 8) for path, start, end in segments]
+    np.unique(np.concatenate(keys or [np.zeros(0, dtype=np.uint64)])).tofile(output_path)
+    return output_path
+
+
+def iter_candidate_pairs(
+    signatures: np.ndarray,
+    has_ngrams: np.ndarray,
+    num_bands: int,
+    work_dir: str | None = None,
+    memory_limit: int | None = None,
+    num_workers: int = 1,
+    executor: concurrent.futures.Executor | None = None,
+    max_bucket_size: int = MAX_BUCKET_SIZE,
+    stats: dict | None = None,
+    key_fn: Callable[[np.ndarray], np.ndarray] | None = None,
+) -> Iterator[np.ndarray]:
+    """
+    Yield (num_pairs, 2) arrays of candidate pairs: documents sharing at least
+    one band (see `bucket_pairs` for oversized buckets). Every pair is yielded
+    once, however many bands it shares. Bucket and pair counts are added into
+    `stats` when given. A key_fn (see `band_records`) must be picklable to run
+    in a process pool.
+
+    Without work_dir all band records are grouped in memory. With work_dir the
+    signatures must be a np.memmap; their band records are spilled to
+    partitions sized to memory_limit (and to a few per worker), which are
+    grouped by `executor`, writing the pairs of a partition in batches of
+    buckets that also fit memory_limit. Pairs found in several batches or band
+    partitions are then merged per range of doc ids and yielded one range at a
+    time.
+    """
+    stats = {} if stats is None else stats
+    # an empty corpus has no signature file to band from
+    if work_dir is None or len(signatures) == 0:
+        pairs, partition_stats = bucket_pairs(
+            band_records(signatures, num_bands, has_ngrams, key_fn=key_fn), max_bucket_size
+        )
+        pairs_unique = unique_pairs(pairs)
+        merge_stats(stats, partition_stats | {"pairs_unique": len(pairs_unique)})
+        yield pairs_unique
+        return
+    assert isinstance(signatures, np.memmap), "out-of-core banding reads the signatures from their file"
+    map_fn = executor.map if executor is not None else map
+
+    # a few partitions per worker so that grouping balances across the pool
+    bits = math.ceil(math.log2(4 * num_workers)) if num_workers > 1 else 0
+    max_pairs = None
+    if memory_limit is not None:
+        # half of a worker's share for the band records of a partition, half for a batch of their pairs
+        budget = max(memory_limit // (2 * num_workers), 1)
+        size = int(np.count_nonzero(has_ngrams)) * num_bands * BAND_RECORD.itemsize * SORT_OVERHEAD
+        bits = max(bits, math.ceil(math.log2(max(size / budget, 1))))
+        # a pair, its key and the sorted keys
+        max_pairs = max(budget // (3 * 8 * SORT_OVERHEAD), 1)
+    bits = min(bits, MAX_PARTITION_BITS)
+    num_partitions = 1 << bits
+
+    num_docs = len(signatures)
+    row_starts = list(range(0, num_docs, SPILL_ROWS))
+    spill_paths = [os.path.join(work_dir, f"bands{i:06d}.bin") for i in range(len(row_starts))]
+    offsets = list(map_fn(
+        _spill_bands,
+        [signatures.filename] * len(row_starts),
+        [signatures.dtype] * len(row_starts),
+        [signatures.shape] * len(row_starts),
+        row_starts,
+        [has_ngrams[start:start + SPILL_ROWS] for start in row_starts],
+        [num_bands] * len(row_starts),
+        [key_fn] * len(row_starts),
+        [bits] * len(row_starts),
+        spill_paths,
+    ))
+    segments = [
+        [
+            (spill_path, bounds[p], bounds[p + 1])
+            for spill_path, bounds in zip(spill_paths, offsets)
+            if bounds[p + 1] > bounds[p]
+        ]
+        for p in range(num_partitions)
+    ]
+    # the same number of doc ranges as band partitions, pair keys are 8 bytes like the records
+    doc_bounds = np.arange(num_partitions + 1, dtype=np.int64) * num_docs // num_partitions
+    key_paths = [os.path.join(work_dir, f"pairs{p:04d}.bin") for p in range(num_partitions)]
+    results = list(map_fn(
+        _partition_pairs,
+        segments,
+        [doc_bounds] * num_partitions,
+        [max_bucket_size] * num_partitions,
+        [max_pairs] * num_partitions,
+        key_paths,
+    ))
+    for spill_path in spill_paths:
+        os.remove(spill_path)
+    for _, partition_stats in results:
+        merge_stats(stats, partition_stats)
+
+    range_segments = [
+        [
+            (key_path, bounds[r], bounds[r + 1])
+            for key_path, (run_bounds, _) in zip(key_paths, results)
+            for bounds in run_bounds
+            if bounds[r + 1] > bounds[r]
+        ]
+        for r in range(num_partitions)
+    ]
+    range_paths = [os.path.join(work_dir, f"range{r:04d}.bin") for r in range(num_partitions)]
+    for range_path in map_fn(_merge_pairs, range_segments, range_paths):
+        pairs = _decode_pairs(np.fromfile(range_path, dtype=np.uint64))
+        os.remove(range_path)
+        merge_stats(stats, {"pairs_unique": len(pairs)})
+        yield pairs
+    for key_path in key_paths:
+        os.remove(key_path)
+
+
+def connected_components(num_nodes: int, edges: np.ndarray) -> np.ndarray:
+    """
+    Component of every node of an undirected graph given as a (num_edges, 2)
+    array, labelled by its smallest node id.
+
+    Each round hooks the larger of the two roots of every edge that still
+    joins two components onto the smaller one (np.minimum.at) and then
+    compresses every node's pointer to its root by pointer jumping. Edges inside
+    one component are dropped as they resolve, and the number of rounds grows
+    with the logarithm of the component size rather than the edge count.
+    """
+    parent = np.arange(num_nodes)
+    u = np.asarray(edges[:, 0], dtype=np.int64)
+    v = np.asarray(edges[:, 1], dtype=np.int64)
+    while len(u):
+        root_u, root_v = parent[u], parent[v]
+        joins = root_u != root_v
+        u, v, root_u, root_v = u[joins], v[joins], root_u[joins], root_v[joins]
+        # roots only ever point at smaller roots, so no cycles form
+        np.minimum.at(parent, np.maximum(root_u, root_v), np.minimum(root_u, root_v))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def cluster_representatives(cluster_id: np.ndarray, lengths: np.ndarray | None = None) -> np.ndarray:
+    """
+    Which node to keep per cluster: the longest one when lengths are given,
+    the smallest id among equally long ones, and the smallest id otherwise.
+    """
+    keep = np.zeros(len(cluster_id), dtype=bool)
+    if lengths is None:
+        keep[cluster_id == np.arange(len(cluster_id))] = True
+        return keep
+    order = np.lexsort((np.arange(len(cluster_id)), -np.asarray(lengths, dtype=np.int64), cluster_id))
+    first = np.r_[True, cluster_id[order][1:] != cluster_id[order][:-1]]
+    keep[order[first]] = True
+    return keep
+
+
+def _lookup(sorted_keys: np.ndarray, values: np.ndarray, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Every (query index, value) with sorted_keys[i] == queries[query index] and values[i] == value."""
+    lo = np.searchsorted(sorted_keys, queries, side="left")
+    counts = np.searchsorted(sorted_keys, queries, side="right") - lo
+    query_index = np.repeat(np.arange(len(queries)), counts)
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+    return query_index, values[positions]
+
+
+class MinHashLSHIndex:
+    """
+    Persistent LSH index over MinHash signatures for online near-duplicate checks.
+
+    Band hashes are kept as a sorted key array with the row of the document
+    they belong to, so a query is a searchsorted per band. Inserts go to a
+    small sorted pending level that is merged into the main level once it
+    grows past a fraction of it. Signatures and caller doc ids are stored per
+    row so that queries can verify candidates against a Jaccard threshold.
+
+    `save` appends the rows added since the index was loaded to the raw
+    doc_ids.bin and signatures.bin, merges the pending level into band_keys.npy
+    and band_rows.npy on disk, and writes meta.json. `load` maps them back, so
+    a loaded index only pages in what a query touches, and a memory-mapped main
+    level is only merged by `save`.
+    """
+
+    # the pending level is merged into the main one when it grows past this fraction of it
+    merge_ratio = 0.25
+    min_pending = 1 << 16
+    # main-level keys moved per step of a merge
+    merge_chunk = 1 << 22
+
+    def __init__(self, num_hashes: int, num_bands: int):
+        assert num_hashes % num_bands == 0
+        self.num_hashes = num_hashes
+        self.num_bands = num_bands
+        self.size = 0
+        # rows below `stored` are in doc_ids and signatures (memory-mapped once loaded), later ones in new_*
+        self.stored = 0
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self.signatures = np.zeros((0, num_hashes), dtype=np.uint32)
+        self.new_doc_ids = np.zeros(0, dtype=np.int64)
+        self.new_signatures = np.zeros((0, num_hashes), dtype=np.uint32)
+        self.band_keys = np.zeros(0, dtype=np.uint64)
+        self.band_rows = np.zeros(0, dtype=np.uint32)
+        self.pending_keys = np.zeros(0, dtype=np.uint64)
+        self.pending_rows = np.zeros(0, dtype=np.uint32)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the stored documents (not counting spare capacity)."""
+        num_keys = len(self.band_keys) + len(self.pending_keys)
+        return self.size * (self.doc_ids.itemsize + self.num_hashes * self.signatures.itemsize) + num_keys * (
+            self.band_keys.itemsize + self.band_rows.itemsize
+        )
+
+    def insert(self, doc_id: int, signature: np.ndarray) -> None:
+        self.insert_batch(np.array([doc_id]), np.asarray(signature)[None, :])
+
+    def insert_batch(self, doc_ids: np.ndarray, signatures: np.ndarray) -> None:
+        """Add documents by their ids and (num_docs, num_hashes) signatures."""
+        signatures = np.asarray(signatures, dtype=np.uint32).reshape(-1, self.num_hashes)
+        if len(signatures) == 0:
+            return
+        rows = self._append(np.asarray(doc_ids, dtype=np.int64), signatures)
+        keys = band_hashes(signatures, self.num_bands).ravel()
+        keys = np.concatenate([self.pending_keys, keys])
+        rows = np.concatenate([self.pending_rows, np.repeat(rows, self.num_bands)])
+        order = np.argsort(keys, kind="stable")
+        self.pending_keys, self.pending_rows = keys[order], rows[order]
+        if isinstance(self.band_keys, np.memmap):
+            return
+        if len(self.pending_keys) > max(self.merge_ratio * len(self.band_keys), self.min_pending):
+            self.merge()
+
+    def merge(self) -> None:
+        """Merge the pending level into the main one, in memory."""
+        if len(self.pending_keys) == 0:
+            return
+        num_keys = len(self.band_keys) + len(self.pending_keys)
+        keys, rows = np.empty(num_keys, dtype=np.uint64), np.empty(num_keys, dtype=np.uint32)
+        self._merge_into(keys, rows)
+        self.band_keys, self.band_rows = keys, rows
+        self.pending_keys = np.zeros(0, dtype=np.uint64)
+        self.pending_rows = np.zeros(0, dtype=np.uint32)
+
+    def _merge_into(self, keys: np.ndarray, rows: np.ndarray) -> None:
+        """Write the main and pending levels, merged, into keys and rows (a main key before an equal pending one)."""
+        # the pending keys go before the main keys at these positions
+        insert_at = np.searchsorted(self.band_keys, self.pending_keys, side="right")
+        for start in range(0, len(self.band_keys), self.merge_chunk):
+            end = min(start + self.merge_chunk, len(self.band_keys))
+            main = np.arange(start, end)
+            positions = main + np.searchsorted(insert_at, main, side="right")
+            keys[positions] = self.band_keys[start:end]
+            rows[positions] = self.band_rows[start:end]
+        positions = insert_at + np.arange(len(insert_at))
+        keys[positions] = self.pending_keys
+        rows[positions] = self.pending_rows
+
+    def query(self, signature: np.ndarray, threshold: float | None = None) -> np.ndarray:
+        return self.query_batch(np.asarray(signature)[None, :], threshold)[0]
+
+    def query_batch(self, signatures: np.ndarray, threshold: float | None = None) -> list[np.ndarray]:
+        """
+        Doc ids of the indexed documents sharing a band with each signature,
+        only those whose signature agreement exceeds threshold when one is given.
+        """
+        signatures = np.asarray(signatures, dtype=np.uint32).reshape(-1, self.num_hashes)
+        keys = band_hashes(signatures, self.num_bands).ravel()
+        query_index, rows = zip(
+            _lookup(self.band_keys, self.band_rows, keys),
+            _lookup(self.pending_keys, self.pending_rows, keys),
+        )
+        # one candidate per (query, row), however many bands they share
+        query_index = np.concatenate(query_index) // self.num_bands
+        rows = np.concatenate(rows).astype(np.int64)
+        pairs = np.unique(query_index * max(self.size, 1) + rows)
+        query_index, rows = pairs // max(self.size, 1), pairs % max(self.size, 1)
+        if threshold is not None:
+            stored_signatures = self._gather(self.signatures, self.new_signatures, rows)
+            agree = np.count_nonzero(stored_signatures == signatures[query_index], axis=1)
+            keep = agree / self.num_hashes > threshold
+            query_index, rows = query_index[keep], rows[keep]
+        bounds = np.searchsorted(query_index, np.arange(len(signatures) + 1))
+        doc_ids = self._gather(self.doc_ids, self.new_doc_ids, rows)
+        return [doc_ids[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def _gather(self, stored: np.ndarray, new: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        is_new = rows >= self.stored
+        values = np.empty((len(rows), *stored.shape[1:]), dtype=stored.dtype)
+        values[~is_new] = stored[rows[~is_new]]
+        values[is_new] = new[rows[is_new] - self.stored]
+        return values
+
+    def _append(self, doc_ids: np.ndarray, signatures: np.ndarray) -> np.ndarray:
+        """Store rows for new documents, growing the new-row arrays by doubling, return their row numbers."""
+        num_new = self.size - self.stored
+        end = num_new + len(signatures)
+        if end > len(self.new_doc_ids):
+            capacity = max(end, 2 * len(self.new_doc_ids), 1024)
+            doc_ids_array = np.zeros(capacity, dtype=np.int64)
+            signatures_array = np.zeros((capacity, self.num_hashes), dtype=np.uint32)
+            doc_ids_array[:num_new] = self.new_doc_ids[:num_new]
+            signatures_array[:num_new] = self.new_signatures[:num_new]
+            self.new_doc_ids, self.new_signatures = doc_ids_array, signatures_array
+        self.new_doc_ids[num_new:end] = doc_ids
+        self.new_signatures[num_new:end] = signatures
+        rows = np.arange(self.size, self.size + len(signatures), dtype=np.uint32)
+        self.size += len(signatures)
+        return rows
+
+    def save(self, directory: os.PathLike) -> None:
+        """Write the index to directory; into the index it was loaded from, only new rows and keys are added."""
+        os.makedirs(directory, exist_ok=True)
+        num_new = self.size - self.stored
+        for name, stored, new in (
+            ("doc_ids", self.doc_ids, self.new_doc_ids),
+            ("signatures", self.signatures, self.new_signatures),
+        ):
+            path = os.path.join(directory, f"{name}.bin")
+            if _is_mapped_from(stored, path):
+                with open(path, "r+b") as f:
+                    # drop rows past the stored ones, e.g. from an interrupted save
+                    f.truncate(stored.nbytes)
+                    f.seek(0, os.SEEK_END)
+                    new[:num_new].tofile(f)
+            else:
+                with open(path + ".tmp", "wb") as f:
+                    for start in range(0, self.stored, self.merge_chunk):
+                        np.asarray(stored[start:start + self.merge_chunk]).tofile(f)
+                    new[:num_new].tofile(f)
+                os.replace(path + ".tmp", path)
+
+        keys_path, rows_path = os.path.join(directory, "band_keys.npy"), os.path.join(directory, "band_rows.npy")
+        if len(self.pending_keys) or not _is_mapped_from(self.band_keys, keys_path):
+            # merged straight into the new files; the old ones may still be mapped, so write next to them and rename
+            num_keys = len(self.band_keys) + len(self.pending_keys)
+            open_memmap = np.lib.format.open_memmap
+            keys = open_memmap(keys_path + ".tmp.npy", mode="w+", dtype=np.uint64, shape=(num_keys,))
+            rows = open_memmap(rows_path + ".tmp.npy", mode="w+", dtype=np.uint32, shape=(num_keys,))
+            self._merge_into(keys, rows)
+            keys.flush()
+            rows.flush()
+            del keys, rows
+            os.replace(keys_path + ".tmp.npy", keys_path)
+            os.replace(rows_path + ".tmp.npy", rows_path)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"num_hashes": self.num_hashes, "num_bands": self.num_bands, "size": self.size}, f)
+        # continue from the saved files, so that the next save only appends
+        saved = self.load(directory)
+        self.__dict__.update(saved.__dict__)
+
+    @classmethod
+    def load(cls, directory: os.PathLike, mmap_mode: str | None = "r") -> "MinHashLSHIndex":
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        index = cls(meta["num_hashes"], meta["num_bands"])
+        index.size = index.stored = meta["size"]
+        index.doc_ids = _load_rows(os.path.join(directory, "doc_ids.bin"), np.int64, (index.size,), mmap_mode)
+        index.signatures = _load_rows(
+            os.path.join(directory, "signatures.bin"), np.uint32, (index.size, index.num_hashes), mmap_mode
+        )
+        for name in ("band_keys", "band_rows"):
+            setattr(index, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode))
+        return index
+
+
+def _is_mapped_from(array: np.ndarray, path: str) -> bool:
+    return isinstance(array, np.memmap) and os.path.abspath(array.filename) == os.path.abspath(path)
+
+
+def _load_rows(path: str, dtype: np.dtype, shape: tuple[int, ...], mmap_mode: str | None) -> np.ndarray:
+    """The first shape[0] rows of a raw file, memory-mapped unless mmap_mode is None (or there are none)."""
+    if mmap_mode is None or shape[0] == 0:
+        return np.fromfile(path, dtype=dtype, count=math.prod(shape)).reshape(shape)
+    return np.memmap(path, dtype=dtype, mode=mmap_mode, shape=shape)
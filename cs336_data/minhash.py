@@ -0,0 +1,82 @@
+"""
+Vectorized MinHash signatures.
+
+Every n-gram is hashed once to a 64-bit integer. The num_hashes hash functions
+are the universal family h_i(x) = (a_i * x + b_i) mod p over the Mersenne prime
+p = 2^31 - 1, so a_i * x fits in uint64 and all hash functions are applied to
+all n-grams in one NumPy broadcast. Signature values are below p and stored as
+uint32.
+
+N-gram shingles are hashed without building their strings: each word is hashed
+once and the word hashes are combined with a rolling hash per window.
+"""
+from collections.abc import Iterable
+
+import mmh3
+import numpy as np
+
+from cs336_data.hashing import rolling_hash
+from cs336_data.profiling import timed
+
+MERSENNE_PRIME = (1 << 31) - 1
+# signature value of a document without any n-gram, larger than any real hash value
+EMPTY_HASH = np.uint32(MERSENNE_PRIME)
+# number of (hash function, n-gram) products materialized at once
+BROADCAST_SIZE = 1 << 20
+
+
+def hash_ngrams(ngrams: Iterable[str]) -> np.ndarray:
+    return np.fromiter((mmh3.hash64(ngram, signed=False)[0] for ngram in ngrams), dtype=np.uint64)
+
+
+@timed
+def hash_word_ngrams(text: str, n: int, unique: bool = True) -> np.ndarray:
+    """
+    uint64 hashes of the word n-grams of text. Matches `word_ngrams` up to hash
+    collisions; with unique=True the result is sorted and duplicate-free.
+    """
+    words = text.split()
+    word_hashes = np.fromiter((mmh3.hash64(word, signed=False)[0] for word in words), dtype=np.uint64, count=len(words))
+    hashes = rolling_hash(word_hashes, n)
+    return np.unique(hashes) if unique else hashes
+
+
+def shingle_collision_stats(text: str, n: int) -> dict[str, float]:
+    """Compare the distinct n-gram strings of text with its distinct n-gram hashes."""
+    words = text.split()
+    num_ngrams = len({" ".join(words[i:i + n]) for i in range(len(words) - n + 1)})
+    num_hashes = len(hash_word_ngrams(text, n))
+    return {
+        "ngrams": num_ngrams,
+        "hashes": num_hashes,
+        "collisions": num_ngrams - num_hashes,
+        "collision_rate": (num_ngrams - num_hashes) / num_ngrams if num_ngrams else 0.0,
+    }
+
+
+class MinHasher:
+    dtype = np.dtype(np.uint32)
+
+    def __init__(self, num_hashes: int, seed: int = 42):
+        rng = np.random.default_rng(seed)
+        self.num_hashes = num_hashes
+        self.a = rng.integers(1, MERSENNE_PRIME, size=(num_hashes, 1), dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=(num_hashes, 1), dtype=np.uint64)
+
+    @timed
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        """MinHash signature (num_hashes,) uint32 of a set of 64-bit n-gram hashes."""
+        signature = np.full(self.num_hashes, EMPTY_HASH, dtype=np.uint32)
+        x = np.asarray(hashes, dtype=np.uint64) % np.uint64(MERSENNE_PRIME)
+        chunk = max(BROADCAST_SIZE // self.num_hashes, 1)
+        for start in range(0, len(x), chunk):
+            values = (self.a * x[start:start + chunk] + self.b) % np.uint64(MERSENNE_PRIME)
+            np.minimum(signature, values.min(axis=1), out=signature, casting="unsafe")
+        return signature
+
+    def signatures(self, hash_sets: Iterable[np.ndarray]) -> np.ndarray:
+        """Signature matrix (num_docs, num_hashes) uint32, one row per n-gram hash set."""
+        rows = [self.signature(hashes) for hashes in hash_sets]
+        if not rows:
+            return np.zeros((0, self.num_hashes), dtype=np.uint32)
+        return np.stack(rows)
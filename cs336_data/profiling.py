@@ -0,0 +1,152 @@
+"""
+Opt-in profiling for the data pipeline.
+
+Timing is off by default. Turn it on with CS336_PROFILE=1 (or --profile on the
+cs336_data.filter command line). Functions decorated with @timed then record
+call counts and wall time per process.
+
+CS336_PROFILE_SAMPLE=<rate> additionally runs cProfile in a random fraction of
+pool workers. Workers started with `worker_init` dump their timings (and pstats
+when sampled) into CS336_PROFILE_DIR when they exit, and `collect` merges every
+dump into one report and one `merged.prof`.
+
+uv run python -m cs336_data.filter --profile --profile-sample-rate 0.25
+uv run python -m pstats profile/merged.prof
+"""
+import cProfile
+import functools
+import glob
+import json
+import multiprocessing.util
+import os
+import pstats
+import random
+import time
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+ENV_ENABLE = "CS336_PROFILE"
+ENV_SAMPLE_RATE = "CS336_PROFILE_SAMPLE"
+ENV_DIR = "CS336_PROFILE_DIR"
+DEFAULT_DIR = "profile"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_enabled = os.environ.get(ENV_ENABLE, "") not in ("", "0")
+# qualified function name -> [calls, total seconds]
+_timings: dict[str, list] = {}
+_profiler: cProfile.Profile | None = None
+
+
+def enable(sample_rate: float | None = None, profile_dir: str | None = None) -> None:
+    """
+    Turn profiling on for this process and any worker it starts afterwards.
+    Settings go through the environment so that spawned workers see them too;
+    arguments left as None keep whatever the environment already says.
+    """
+    global _enabled
+    _enabled = True
+    os.environ[ENV_ENABLE] = "1"
+    if sample_rate is not None:
+        os.environ[ENV_SAMPLE_RATE] = str(sample_rate)
+    os.environ[ENV_DIR] = profile_dir or os.environ.get(ENV_DIR, DEFAULT_DIR)
+    os.makedirs(os.environ[ENV_DIR], exist_ok=True)
+    # drop dumps left behind by an earlier run so `collect` only sees this one
+    for path in glob.glob(os.path.join(os.environ[ENV_DIR], "worker-*")):
+        os.remove(path)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def timed(fn: F) -> F:
+    """Record calls and wall time of `fn` while profiling is enabled."""
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            entry = _timings.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+    return wrapper
+
+
+def get_timings() -> dict[str, tuple[int, float]]:
+    return {name: (calls, seconds) for name, (calls, seconds) in _timings.items()}
+
+
+def reset_timings() -> None:
+    _timings.clear()
+
+
+def worker_init() -> None:
+    """
+    Initializer for ProcessPoolExecutor / multiprocessing.Pool workers.
+    Forked workers inherit the parent's counters, so start from zero, maybe
+    start cProfile, and register a dump that runs when the worker exits cleanly.
+    """
+    global _profiler
+    if not _enabled:
+        return
+    reset_timings()
+    sample_rate = float(os.environ.get(ENV_SAMPLE_RATE, "0") or 0)
+    if sample_rate > 0 and random.random() < sample_rate:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    multiprocessing.util.Finalize(None, dump, exitpriority=10)
+
+
+def dump(profile_dir: str | None = None) -> None:
+    """Write this process's timings (and pstats, if sampled) to the profile directory."""
+    global _profiler
+    if not _enabled:
+        return
+    profile_dir = profile_dir or os.environ.get(ENV_DIR, DEFAULT_DIR)
+    os.makedirs(profile_dir, exist_ok=True)
+    prefix = os.path.join(profile_dir, f"worker-{os.getpid()}")
+    with open(prefix + ".json", "w") as f:
+        json.dump(_timings, f)
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(prefix + ".prof")
+        _profiler = None
+
+
+def collect(profile_dir: str | None = None) -> dict[str, tuple[int, float]]:
+    """
+    Merge the timings of this process and every dumped worker. Worker pstats are
+    combined into `merged.prof` in the same directory.
+    """
+    profile_dir = profile_dir or os.environ.get(ENV_DIR, DEFAULT_DIR)
+    merged = {name: [calls, seconds] for name, (calls, seconds) in _timings.items()}
+    for path in sorted(glob.glob(os.path.join(profile_dir, "worker-*.json"))):
+        with open(path) as f:
+            for name, (calls, seconds) in json.load(f).items():
+                entry = merged.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += seconds
+
+    prof_paths = sorted(glob.glob(os.path.join(profile_dir, "worker-*.prof")))
+    if prof_paths:
+        stats = pstats.Stats(prof_paths[0])
+        for path in prof_paths[1:]:
+            stats.add(path)
+        stats.dump_stats(os.path.join(profile_dir, "merged.prof"))
+    return {name: (calls, seconds) for name, (calls, seconds) in merged.items()}
+
+
+def format_timings(timings: dict[str, tuple[int, float]]) -> str:
+    total = sum(seconds for _, seconds in timings.values()) or 1.0
+    lines = [f"{'function':<60} {'calls':>10} {'seconds':>10} {'us/call':>10} {'share':>7}"]
+    for name, (calls, seconds) in sorted(timings.items(), key=lambda item: -item[1][1]):
+        per_call = seconds / calls * 1e6 if calls else 0.0
+        lines.append(f"{name:<60} {calls:>10} {seconds:>10.2f} {per_call:>10.1f} {seconds / total:>7.1%}")
+    return "\n".join(lines)
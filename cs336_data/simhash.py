@@ -0,0 +1,77 @@
+"""
+SimHash fingerprints and permuted-table Hamming search.
+
+A document's fingerprint is the bitwise majority vote over the 64-bit hashes of
+its n-grams: bit i is set when more than half of the n-gram hashes have bit i
+set. Similar n-gram sets give fingerprints a small Hamming distance apart, and
+a document costs 8 bytes instead of num_hashes MinHash values.
+
+Near duplicates within max_distance bits are found with permuted tables
+(Manku et al., "Detecting Near-Duplicates for Web Crawling"): the 64 bits are
+split into num_blocks blocks, and two fingerprints that differ in at most
+max_distance bits agree exactly on at least num_blocks - max_distance blocks.
+Every choice of num_blocks - max_distance blocks is one table whose key is the
+fingerprint masked to those blocks, so candidates are documents sharing a key
+in any table, which is exactly LSH banding with masked keys.
+"""
+import itertools
+
+import numpy as np
+
+from cs336_data.hashing import POPCOUNT, mix64
+from cs336_data.profiling import timed
+
+FINGERPRINT_BITS = 64
+
+
+def fingerprint(hashes: np.ndarray) -> np.uint64:
+    """SimHash of a set of 64-bit n-gram hashes, 0 for an empty set."""
+    hashes = np.asarray(hashes, dtype="<u8")
+    if len(hashes) == 0:
+        return np.uint64(0)
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(hashes)
+    return np.packbits(majority, bitorder="little").view("<u8")[0]
+
+
+def hamming_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Number of differing bits between every pair of uint64 fingerprints."""
+    differ = np.ascontiguousarray(np.bitwise_xor(a, b), dtype=np.uint64)
+    return POPCOUNT[differ.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+def block_masks(num_blocks: int) -> list[int]:
+    """Split the fingerprint bits into num_blocks contiguous blocks of (nearly) equal size."""
+    bounds = np.linspace(0, FINGERPRINT_BITS, num_blocks + 1).round().astype(int)
+    return [((1 << int(hi)) - 1) ^ ((1 << int(lo)) - 1) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def table_masks(num_blocks: int, max_distance: int) -> np.ndarray:
+    """One uint64 mask per table: every choice of num_blocks - max_distance blocks."""
+    assert 0 <= max_distance < num_blocks
+    blocks = block_masks(num_blocks)
+    return np.array(
+        [sum(chosen) for chosen in itertools.combinations(blocks, num_blocks - max_distance)], dtype=np.uint64
+    )
+
+
+def table_keys(fingerprints: np.ndarray, num_blocks: int, max_distance: int) -> np.ndarray:
+    """
+    (num_docs, num_tables) uint64 keys of every fingerprint (a (num_docs,) or
+    (num_docs, 1) array), with the table index mixed in like LSH band hashes.
+    """
+    masks = table_masks(num_blocks, max_distance)
+    fingerprints = np.asarray(fingerprints, dtype=np.uint64).reshape(-1, 1)
+    tables = np.arange(len(masks), dtype=np.uint64)
+    return mix64((fingerprints & masks) ^ mix64(tables))
+
+
+class SimHasher:
+    """Same interface as `MinHasher`: a signature is one uint64 fingerprint."""
+
+    num_hashes = 1
+    dtype = np.dtype(np.uint64)
+
+    @timed
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        return np.array([fingerprint(hashes)], dtype=np.uint64)
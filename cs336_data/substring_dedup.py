@@ -0,0 +1,217 @@
+"""
+Exact substring deduplication over a tokenized corpus.
+
+The input is the flat uint16 token file written by `cs336_data.filter.tokenize`,
+where every document ends with the EOS token. A span of at least min_length
+tokens that occurs more than once is kept at its first occurrence and removed
+everywhere else.
+
+Repeated spans are found from windows of min_length tokens that do not cross a
+document boundary: the union of the windows that repeat an earlier window is
+exactly the set of repeated spans of at least min_length tokens. Sorting the
+windows lexicographically gives a suffix array truncated at min_length tokens,
+where repeats are adjacent. To keep that cheap the token file is read once, in
+chunks from a memmap, and every window is hashed with a rolling hash into
+partition files on the top hash bits. Within a partition only windows whose
+hash repeats can repeat, and only those are materialized, in batches that never
+split a run of equal hashes, and sorted as big-endian byte strings to confirm
+the repeats exactly. Partitions and batches each take half of memory_limit.
+
+uv run python -m cs336_data.substring_dedup data/train.bin data/train.dedup.bin --min-length 50
+"""
+import argparse
+import math
+import os
+import tempfile
+
+import numpy as np
+
+from cs336_data.hashing import MAX_PARTITION_BITS, SORT_OVERHEAD, rolling_hash
+
+EOS_TOKEN_ID = 50256  # GPT-2 <|endoftext|>, appended to every document by `tokenize`
+CHUNK_TOKENS = 1 << 24
+WINDOW_RECORD = np.dtype([("hash", "<u8"), ("position", "<i8")])
+
+
+def iter_chunks(tokens: np.ndarray, overlap: int = 0):
+    """
+    Yield (start, stop, tokens[start:stop + overlap]) for consecutive chunks
+    [start, stop) of CHUNK_TOKENS tokens.
+    """
+    for start in range(0, len(tokens), CHUNK_TOKENS):
+        stop = min(start + CHUNK_TOKENS, len(tokens))
+        yield start, stop, np.asarray(tokens[start:stop + overlap])
+
+
+def document_windows(tokens: np.ndarray, n: int, eos_token_id: int) -> tuple[np.ndarray, np.ndarray]:
+    """Starts and rolling hashes of the windows of n tokens that stay inside one document (contain no EOS)."""
+    hashes = rolling_hash(tokens, n)
+    # number of EOS tokens before every position
+    eos_before = np.r_[0, np.cumsum(tokens == eos_token_id, dtype=np.int32)]
+    positions = np.flatnonzero(eos_before[n:] == eos_before[:len(hashes)])
+    return positions, hashes[positions]
+
+
+def _spill_windows(tokens: np.ndarray, min_length: int, eos_token_id: int, bits: int, spill_dir: str) -> list[str]:
+    """
+    Write the (hash, position) records of every window that stays inside one
+    document to 2**bits partition files on the top hash bits, in position order.
+    """
+    paths = [os.path.join(spill_dir, f"windows{p:03d}.bin") for p in range(1 << bits)]
+    handles = [open(path, "wb") for path in paths]
+    for start, stop, chunk in iter_chunks(tokens, overlap=min_length - 1):
+        positions, hashes = document_windows(chunk, min_length, eos_token_id)
+        # windows starting in the overlap belong to the next chunk
+        positions, hashes = positions[positions < stop - start], hashes[positions < stop - start]
+        records = np.empty(len(positions), dtype=WINDOW_RECORD)
+        records["hash"] = hashes
+        records["position"] = positions + start
+        if bits:
+            partition = (records["hash"] >> np.uint64(64 - bits)).astype(np.uint8)
+        else:
+            partition = np.zeros(len(records), dtype=np.uint8)
+        # a stable (radix) sort on the small partition ids keeps every partition in position order
+        order = np.argsort(partition, kind="stable")
+        bounds = np.searchsorted(partition[order], np.arange((1 << bits) + 1))
+        for handle, lo, hi in zip(handles, bounds[:-1], bounds[1:]):
+            records[order[lo:hi]].tofile(handle)
+    for handle in handles:
+        handle.close()
+    return paths
+
+
+def _repeats(tokens: np.ndarray, positions: np.ndarray, min_length: int) -> np.ndarray:
+    """Starts of the windows at positions, equal windows in position order, that repeat an earlier window."""
+    # big-endian bytes compare like the token sequences
+    windows = np.empty((len(positions), min_length), dtype=">u2")
+    for offset in range(min_length):
+        windows[:, offset] = tokens[positions + offset]
+    windows = windows.view(f"V{2 * min_length}").ravel()
+    # the sort is stable, so equal windows stay in position order and the first one is the first occurrence
+    order = np.argsort(windows, kind="stable")
+    windows = windows[order]
+    return positions[order][np.r_[False, windows[1:] == windows[:-1]]]
+
+
+def repeated_window_starts(
+    tokens: np.ndarray, records: np.ndarray, min_length: int, max_windows: int | None = None
+) -> np.ndarray:
+    """
+    Sorted starts of the windows among the position-sorted records that repeat
+    an earlier window. Windows whose hash repeats are materialized at most
+    max_windows at a time (all at once by default), but a run of equal hashes
+    is never split.
+    """
+    # windows can only be equal if their hashes are; the stable sort keeps equal hashes in position order
+    order = np.argsort(records["hash"], kind="stable")
+    hashes = records["hash"][order]
+    equal_next = hashes[1:] == hashes[:-1]
+    shared = np.r_[False, equal_next] | np.r_[equal_next, False]
+    hashes, positions = hashes[shared], records["position"][order[shared]]
+    bounds = np.r_[np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]]), len(hashes)]
+    max_windows = max_windows or len(hashes)
+    starts = [np.zeros(0, dtype=np.int64)]
+    lo = 0
+    while lo < len(hashes):
+        # the last run boundary within max_windows, or the end of the first run if that one is longer
+        hi = bounds[max(np.searchsorted(bounds, lo + max_windows, "right") - 1, np.searchsorted(bounds, lo, "right"))]
+        starts.append(_repeats(tokens, positions[lo:hi], min_length))
+        lo = hi
+    return np.sort(np.concatenate(starts))
+
+
+def _removed_mask(starts: np.ndarray, chunk_start: int, chunk_end: int, min_length: int) -> np.ndarray:
+    """Which tokens of [chunk_start, chunk_end) are covered by a window starting at one of the sorted starts."""
+    lo = np.searchsorted(starts, chunk_start - min_length + 1)
+    hi = np.searchsorted(starts, chunk_end)
+    delta = np.zeros(chunk_end - chunk_start + 1, dtype=np.int32)
+    window_starts = starts[lo:hi] - chunk_start
+    np.add.at(delta, np.maximum(window_starts, 0), 1)
+    np.add.at(delta, np.minimum(window_starts + min_length, chunk_end - chunk_start), -1)
+    return np.cumsum(delta[:-1]) > 0
+
+
+def substring_deduplicate(
+    input_path: os.PathLike,
+    output_path: os.PathLike,
+    min_length: int = 50,
+    memory_limit: int = 1 << 30,
+    eos_token_id: int = EOS_TOKEN_ID,
+    tmp_dir: os.PathLike | None = None,
+) -> dict:
+    """
+    Remove every repeated span of at least min_length tokens but its first
+    occurrence from the token file at input_path, writing the result to
+    output_path. EOS tokens are never removed, but documents left empty are
+    dropped.
+
+    Next to the output, `<output_path>.docs.npz` holds "offsets", the start of
+    every output document plus the total length, and "source_docs", the index
+    of every output document in the input. Returns token and document counts.
+    """
+    tokens = np.memmap(input_path, dtype=np.uint16, mode="r")
+    # half of memory_limit for a partition of records, half for a batch of windows and their sorted copy
+    size = len(tokens) * WINDOW_RECORD.itemsize * SORT_OVERHEAD
+    bits = min(math.ceil(math.log2(max(2 * size / memory_limit, 1))), MAX_PARTITION_BITS)
+    max_windows = max(memory_limit // (2 * 2 * min_length * SORT_OVERHEAD), 1)
+    starts = [np.zeros(0, dtype=np.int64)]
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as spill_dir:
+        for path in _spill_windows(tokens, min_length, eos_token_id, bits, spill_dir):
+            records = np.fromfile(path, dtype=WINDOW_RECORD)
+            starts.append(repeated_window_starts(tokens, records, min_length, max_windows))
+            os.remove(path)
+    starts = np.sort(np.concatenate(starts))
+
+    offsets, source_docs = [0], []
+    written = 0
+    input_docs = 0
+    previous_eos = True  # a document that starts with EOS is empty
+    with open(output_path, "wb") as fout:
+        for chunk_start, _, chunk in iter_chunks(tokens):
+            kept_index = np.flatnonzero(~_removed_mask(starts, chunk_start, chunk_start + len(chunk), min_length))
+            kept = chunk[kept_index]
+            is_eos = kept == eos_token_id
+            # index in the input of the document every kept token belongs to
+            doc_index = input_docs + np.cumsum(chunk == eos_token_id)[kept_index] - is_eos
+            empty = is_eos & np.r_[previous_eos, is_eos[:-1]]
+            kept, is_eos, doc_index = kept[~empty], is_eos[~empty], doc_index[~empty]
+            kept.tofile(fout)
+            offsets.extend((written + np.flatnonzero(is_eos) + 1).tolist())
+            source_docs.extend(doc_index[is_eos].tolist())
+            written += len(kept)
+            input_docs += int(np.count_nonzero(chunk == eos_token_id))
+            if len(kept):
+                previous_eos = bool(is_eos[-1])
+    if not previous_eos:
+        # the last document has no EOS
+        offsets.append(written)
+        source_docs.append(input_docs)
+    np.savez(
+        f"{output_path}.docs.npz",
+        offsets=np.array(offsets, dtype=np.int64),
+        source_docs=np.array(source_docs, dtype=np.int64),
+    )
+    return {
+        "input_tokens": len(tokens),
+        "output_tokens": written,
+        "removed_tokens": len(tokens) - written,
+        "repeated_windows": len(starts),
+        "input_docs": input_docs + int(len(tokens) > 0 and tokens[-1] != eos_token_id),
+        "output_docs": len(source_docs),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", help="uint16 token file, documents separated by EOS")
+    parser.add_argument("output_path")
+    parser.add_argument("--min-length", type=int, default=50, help="shortest repeated span to remove, in tokens")
+    parser.add_argument("--memory-limit", type=int, default=1 << 30, help="bytes for one partition of windows")
+    parser.add_argument("--eos-token-id", type=int, default=EOS_TOKEN_ID)
+    parser.add_argument("--tmp-dir", default=None, help="where to spill window hashes")
+    args = parser.parse_args()
+    stats = substring_deduplicate(
+        args.input_path, args.output_path, args.min_length, args.memory_limit, args.eos_token_id, args.tmp_dir
+    )
+    for name, value in stats.items():
+        print(f"{name}: {value:,}")
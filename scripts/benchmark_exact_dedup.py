@@ -0,0 +1,111 @@
+"""
+Benchmark exact line deduplication: the hex-string dict of blake2 digests we used
+before against the compact HashCounter in `exact_dedup`, and the partitioned
+path with a memory cap or several workers.
+
+Each implementation runs in its own forked process so that peak RSS is measured
+independently.
+
+uv run python scripts/benchmark_exact_dedup.py --num-lines 2000000 --num-workers 1 8 64
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+
+from cs336_data.dedup import exact_dedup, hash_string_blake2
+
+
+def dict_exact_dedup(input_files: list[os.PathLike], output_directory: os.PathLike) -> None:
+    myd = collections.defaultdict(int)
+    for input_file in input_files:
+        with open(input_file, encoding="utf-8", errors="replace") as fin:
+            for line in fin:
+                myd[hash_string_blake2(line.rstrip("\n"))] += 1
+
+    for input_file in input_files:
+        output_file = os.path.join(output_directory, os.path.basename(input_file))
+        with open(input_file, encoding="utf-8", errors="replace") as fin, \
+            open(output_file, "w", encoding="utf-8") as fout:
+            for line in fin:
+                if myd[hash_string_blake2(line.rstrip("\n"))] == 1:
+                    fout.write(line)
+
+
+IMPLEMENTATIONS = {
+    "dict[blake2 hex]": (dict_exact_dedup, {}),
+    "HashCounter": (exact_dedup, {}),
+    "spill 64MiB": (exact_dedup, {"memory_limit": 64 << 20}),
+}
+
+
+def make_corpus(directory: str, num_lines: int, num_files: int, duplicate_ratio: float, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(50_000)]
+    pool = [" ".join(rng.choices(words, k=12)) for _ in range(max(1, num_lines // 100))]
+    paths = []
+    for file_idx in range(num_files):
+        path = os.path.join(directory, f"shard{file_idx:03d}.txt")
+        with open(path, "w") as f:
+            for line_idx in range(num_lines // num_files):
+                if rng.random() < duplicate_ratio:
+                    f.write(rng.choice(pool) + "\n")
+                else:
+                    f.write(f"{file_idx} {line_idx} " + " ".join(rng.choices(words, k=10)) + "\n")
+        paths.append(path)
+    return paths
+
+
+def _run(name: str, paths: list[str], output_dir: str, queue: multiprocessing.Queue) -> None:
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    fn, kwargs = IMPLEMENTATIONS[name]
+    fn(paths, output_dir, **kwargs)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux, pool workers count through RUSAGE_CHILDREN
+    peak_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    queue.put((elapsed, start_rss, peak_rss))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-lines", type=int, default=1_000_000)
+    parser.add_argument("--num-files", type=int, default=8)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3)
+    parser.add_argument("--num-workers", type=int, nargs="*", default=[2], help="worker counts of the parallel mode")
+    args = parser.parse_args()
+    for num_workers in args.num_workers:
+        IMPLEMENTATIONS[f"parallel x{num_workers}"] = (exact_dedup, {"num_workers": num_workers})
+
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_corpus(tmp, args.num_lines, args.num_files, args.duplicate_ratio)
+        num_lines = args.num_lines // args.num_files * args.num_files
+        print(f"{num_lines} lines in {args.num_files} files, duplicate ratio {args.duplicate_ratio}")
+        print(f"{'implementation':<20} {'seconds':>8} {'lines/s':>12} {'peak RSS MiB':>13} {'growth MiB':>11}")
+        outputs = []
+        for name in IMPLEMENTATIONS:
+            output_dir = os.path.join(tmp, name.replace(" ", "_"))
+            os.makedirs(output_dir)
+            queue = context.Queue()
+            process = context.Process(target=_run, args=(name, paths, output_dir, queue))
+            process.start()
+            elapsed, start_rss, peak_rss = queue.get()
+            process.join()
+            print(
+                f"{name:<20} {elapsed:>8.2f} {num_lines / elapsed:>12,.0f} "
+                f"{peak_rss / 1024:>13.1f} {(peak_rss - start_rss) / 1024:>11.1f}"
+            )
+            outputs.append([open(os.path.join(output_dir, os.path.basename(p))).read() for p in paths])
+        print("outputs identical:", all(output == outputs[0] for output in outputs))
+
+
+if __name__ == "__main__":
+    main()
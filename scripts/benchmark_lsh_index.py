@@ -0,0 +1,83 @@
+"""
+Benchmark `MinHashLSHIndex`: insert throughput, single and batched query
+latency on a fresh and on a loaded (memory-mapped) index, and the index size
+per million documents. Signatures are random, with a fraction of the queries
+being near duplicates of indexed documents.
+
+uv run python scripts/benchmark_lsh_index.py --num-docs 1000000 --num-hashes 128 --num-bands 16
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from cs336_data.lsh import MinHashLSHIndex
+from cs336_data.minhash import MERSENNE_PRIME
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def time_queries(index: MinHashLSHIndex, queries: np.ndarray, batch_size: int, threshold: float) -> dict[str, float]:
+    start = time.perf_counter()
+    for query in queries[:1000]:
+        index.query(query, threshold)
+    single = (time.perf_counter() - start) / min(len(queries), 1000)
+    start = time.perf_counter()
+    hits = 0
+    for batch_start in range(0, len(queries), batch_size):
+        results = index.query_batch(queries[batch_start:batch_start + batch_size], threshold)
+        hits += sum(len(doc_ids) > 0 for doc_ids in results)
+    batched = (time.perf_counter() - start) / len(queries)
+    return {"single_us": single * 1e6, "batched_us": batched * 1e6, "hit_rate": hits / len(queries)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-docs", type=int, default=1_000_000)
+    parser.add_argument("--num-hashes", type=int, default=128)
+    parser.add_argument("--num-bands", type=int, default=16)
+    parser.add_argument("--num-queries", type=int, default=10_000)
+    parser.add_argument("--insert-batch-size", type=int, default=10_000)
+    parser.add_argument("--query-batch-size", type=int, default=1_000)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--duplicate-fraction", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    index = MinHashLSHIndex(args.num_hashes, args.num_bands)
+    start = time.perf_counter()
+    for batch_start in range(0, args.num_docs, args.insert_batch_size):
+        count = min(args.insert_batch_size, args.num_docs - batch_start)
+        signatures = rng.integers(0, MERSENNE_PRIME, size=(count, args.num_hashes), dtype=np.uint32)
+        index.insert_batch(np.arange(batch_start, batch_start + count), signatures)
+    index.merge()
+    elapsed = time.perf_counter() - start
+    print(f"inserted {args.num_docs:,} documents in {elapsed:.1f}s ({args.num_docs / elapsed:,.0f} docs/s)")
+
+    # near duplicates keep 90% of the signature of an indexed document
+    queries = rng.integers(0, MERSENNE_PRIME, size=(args.num_queries, args.num_hashes), dtype=np.uint32)
+    num_duplicates = int(args.num_queries * args.duplicate_fraction)
+    rows = rng.integers(0, args.num_docs, size=num_duplicates)
+    keep = rng.random((num_duplicates, args.num_hashes)) < 0.9
+    queries[:num_duplicates] = np.where(keep, index.new_signatures[rows], queries[:num_duplicates])
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index.save(index_dir)
+        disk_bytes = directory_size(index_dir)
+        per_million = 1_000_000 / args.num_docs
+        print(f"index size: {index.nbytes * per_million / 2**20:,.0f} MiB in memory, "
+              f"{disk_bytes * per_million / 2**20:,.0f} MiB on disk per million documents")
+        print(f"\n{'index':<10} {'us/query':>10} {'us/query (batched)':>20} {'hit rate':>10}")
+        # save leaves the index mapped from index_dir
+        in_memory = MinHashLSHIndex.load(index_dir, mmap_mode=None)
+        for name, candidate in [("in memory", in_memory), ("mmap", MinHashLSHIndex.load(index_dir))]:
+            result = time_queries(candidate, queries, args.query_batch_size, args.threshold)
+            print(f"{name:<10} {result['single_us']:>10.1f} {result['batched_us']:>20.1f} {result['hit_rate']:>10.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark MinHash signatures: the md5-per-(hash function, n-gram) loop of
+`minhash_signature` against the vectorized `MinHasher`, on the fuzzy duplicate
+fixtures. Also reports how well each estimates the true n-gram Jaccard.
+
+uv run python scripts/benchmark_minhash.py --num-hashes 500
+"""
+import argparse
+import itertools
+import pathlib
+import time
+
+import numpy as np
+
+from cs336_data.dedup import minhash_signature, normalize_text, word_ngrams
+from cs336_data.minhash import MinHasher, hash_ngrams
+
+FIXTURES_PATH = pathlib.Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-hashes", type=int, default=500)
+    parser.add_argument("--ngram-size", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    ngram_sets = {path.name: word_ngrams(normalize_text(path.read_text()), args.ngram_size) for path in paths}
+    num_ngrams = sum(len(ngrams) for ngrams in ngram_sets.values())
+    print(f"{len(paths)} documents, {num_ngrams} n-grams, {args.num_hashes} hash functions")
+
+    hasher = MinHasher(args.num_hashes)
+    implementations = {
+        "minhash_signature": lambda ngrams: np.array(minhash_signature(ngrams, args.num_hashes), dtype=object),
+        "MinHasher": lambda ngrams: hasher.signature(hash_ngrams(ngrams)),
+    }
+    signatures = {}
+    print(f"{'implementation':<20} {'ms/doc':>10} {'n-grams/s':>12}")
+    for name, fn in implementations.items():
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            signatures[name] = {doc: fn(ngrams) for doc, ngrams in ngram_sets.items()}
+        elapsed = (time.perf_counter() - start) / args.repeats
+        print(f"{name:<20} {elapsed / len(paths) * 1e3:>10.2f} {num_ngrams / elapsed:>12,.0f}")
+
+    print(f"\n{'pair':<50} {'jaccard':>8}" + "".join(f" {name:>18}" for name in implementations))
+    for a, b in itertools.combinations(ngram_sets, 2):
+        true_jaccard = len(ngram_sets[a] & ngram_sets[b]) / len(ngram_sets[a] | ngram_sets[b])
+        estimates = "".join(f" {np.mean(sig[a] == sig[b]):>18.3f}" for sig in signatures.values())
+        print(f"{a + ' / ' + b:<50} {true_jaccard:>8.3f}{estimates}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark dedup text normalization: the previous regex / per-character
+category version against the translate-table `normalize_text`, on multilingual
+text. Reports chars/sec and whether accents are actually removed.
+
+uv run python scripts/benchmark_normalize.py --repeats 20
+"""
+import argparse
+import pathlib
+import re
+import time
+import unicodedata
+
+from cs336_data.dedup import normalize_text
+
+FIXTURES_PATH = pathlib.Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+
+SAMPLES = [
+    "Le cœur a ses raisons que la raison ne connaît point. Où est la bibliothèque ?",
+    "Über den Wolken muss die Freiheit wohl grenzenlos sein, schöne Grüße aus Köln!",
+    "¿Dónde está el niño? La acción de la canción es pequeña, señor.",
+    "Tiếng Việt có rất nhiều dấu: ả, ẫ, ặ, ề, ở, ự — thật là phức tạp.",
+    "Съешь же ещё этих мягких французских булок, да выпей чаю.",
+    "東京タワーは日本の首都にある有名な観光地です。ガイドブックを読んでください。",
+    "مرحبا بالعالم، هذه جملة عربية مع علامات التشكيل: مُحَمَّد.",
+    "हिन्दी एक सुंदर भाषा है, जिसमें मात्राएँ और अनुस्वार होते हैं।",
+    "Ελληνικά: καλημέρα, ευχαριστώ πολύ! Άλφα, Ωμέγα.",
+]
+
+
+def regex_normalize_text(text: str) -> str:
+    text = text.lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    text = unicodedata.normalize("NFD", text)
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    english = (FIXTURES_PATH / "high_quality_wiki_reference.txt").read_text()
+    texts = {"multilingual": "\n".join(SAMPLES) * 200, "english": english}
+    print(f"{'implementation':<16} {'text':<14} {'chars':>9} {'chars/s':>14}")
+    for name, fn in {"regex + category": regex_normalize_text, "translate table": normalize_text}.items():
+        for text_name, text in texts.items():
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                fn(text)
+            elapsed = (time.perf_counter() - start) / args.repeats
+            print(f"{name:<16} {text_name:<14} {len(text):>9} {len(text) / elapsed:>14,.0f}")
+
+    print()
+    for sample in SAMPLES[:4]:
+        print(f"regex:     {regex_normalize_text(sample)}")
+        print(f"translate: {normalize_text(sample)}")
+
+
+if __name__ == "__main__":
+    main()
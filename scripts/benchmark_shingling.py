@@ -0,0 +1,67 @@
+"""
+Benchmark n-gram shingling for MinHash: the set of joined n-gram strings built by
+`word_ngrams` (then hashed) against `hash_word_ngrams`, which combines per-word
+hashes with a rolling hash. Reports time, peak traced memory and how many
+distinct n-grams were lost to hash collisions.
+
+uv run python scripts/benchmark_shingling.py --num-words 1000000
+"""
+import argparse
+import pathlib
+import random
+import time
+import tracemalloc
+
+from cs336_data.dedup import normalize_text, word_ngrams
+from cs336_data.minhash import hash_ngrams, hash_word_ngrams, shingle_collision_stats
+
+FIXTURES_PATH = pathlib.Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-words", type=int, default=500_000)
+    parser.add_argument("--vocab-size", type=int, default=5_000)
+    parser.add_argument("--ngram-size", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocab = [f"word{i}" for i in range(args.vocab_size)]
+    documents = {path.name: normalize_text(path.read_text()) for path in sorted(FIXTURES_PATH.rglob("*.txt"))}
+    documents["synthetic"] = " ".join(rng.choices(vocab, k=args.num_words))
+
+    implementations = {
+        "strings + hash": lambda text: hash_ngrams(word_ngrams(text, args.ngram_size)),
+        "rolling hash": lambda text: hash_word_ngrams(text, args.ngram_size),
+    }
+    print(f"{'implementation':<16} {'seconds':>8} {'n-grams/s':>12} {'peak MiB':>9}")
+    for name, fn in implementations.items():
+        total_elapsed, total_ngrams, peak = 0.0, 0, 0
+        for text in documents.values():
+            hashes, elapsed, doc_peak = measure(fn, text)
+            total_elapsed += elapsed
+            total_ngrams += len(hashes)
+            peak = max(peak, doc_peak)
+        print(f"{name:<16} {total_elapsed:>8.3f} {total_ngrams / total_elapsed:>12,.0f} {peak / 2**20:>9.1f}")
+
+    print(f"\n{'document':<40} {'n-grams':>10} {'hashes':>10} {'collisions':>10} {'rate':>10}")
+    for name, text in documents.items():
+        stats = shingle_collision_stats(text, args.ngram_size)
+        print(
+            f"{name:<40} {stats['ngrams']:>10} {stats['hashes']:>10} "
+            f"{stats['collisions']:>10} {stats['collision_rate']:>10.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark the SimHash engine against MinHash LSH: recall and precision of
+near-duplicate pairs, signature throughput, and memory per document.
+
+The corpus is the fuzzy duplicate fixtures plus --variants copies of each with
+a random fraction of their words replaced. A pair counts as a true near
+duplicate when the Jaccard similarity of its n-gram sets exceeds --threshold,
+and as found when both documents end up in the same cluster.
+
+uv run python scripts/benchmark_simhash.py --variants 50 --max-edit-rate 0.1
+"""
+import argparse
+import functools
+import itertools
+import pathlib
+import time
+
+import numpy as np
+
+from cs336_data.dedup import normalize_text
+from cs336_data.lsh import BAND_RECORD, connected_components, iter_candidate_pairs
+from cs336_data.minhash import MinHasher, hash_word_ngrams
+from cs336_data.simhash import SimHasher, hamming_distance, table_keys
+
+FIXTURES_PATH = pathlib.Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+
+
+def make_corpus(variants: int, max_edit_rate: float, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    documents = [path.read_text() for path in sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))]
+    corpus = list(documents)
+    for document in documents:
+        words = document.split()
+        for _ in range(variants):
+            edited = list(words)
+            rate = rng.uniform(0, max_edit_rate)
+            for i in np.flatnonzero(rng.random(len(words)) < rate):
+                edited[i] = f"edit{rng.integers(1 << 20)}"
+            corpus.append(" ".join(edited))
+    return corpus
+
+
+def cluster(signatures: np.ndarray, num_bands: int, key_fn, is_match) -> np.ndarray:
+    has_ngrams = np.ones(len(signatures), dtype=bool)
+    pairs = np.concatenate(list(iter_candidate_pairs(signatures, has_ngrams, num_bands, key_fn=key_fn)))
+    return connected_components(len(signatures), pairs[is_match(pairs)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", type=int, default=50)
+    parser.add_argument("--max-edit-rate", type=float, default=0.1)
+    parser.add_argument("--ngram-size", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--num-hashes", type=int, default=128)
+    parser.add_argument("--num-bands", type=int, default=16)
+    parser.add_argument("--max-hamming-distance", type=int, default=3)
+    parser.add_argument("--num-blocks", type=int, default=6)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.variants, args.max_edit_rate)
+    ngram_sets = [hash_word_ngrams(normalize_text(text), args.ngram_size) for text in corpus]
+    true_pairs = {
+        (i, j)
+        for i, j in itertools.combinations(range(len(corpus)), 2)
+        if len(np.intersect1d(ngram_sets[i], ngram_sets[j], assume_unique=True))
+        / len(np.union1d(ngram_sets[i], ngram_sets[j])) > args.threshold
+    }
+    print(f"{len(corpus)} documents, {len(true_pairs)} near-duplicate pairs above Jaccard {args.threshold}")
+
+    minhasher = MinHasher(args.num_hashes)
+    num_tables = len(list(itertools.combinations(range(args.num_blocks), args.max_hamming_distance)))
+    engines = {
+        "minhash": (
+            minhasher,
+            args.num_bands,
+            None,
+            lambda signatures: lambda pairs: (
+                np.mean(signatures[pairs[:, 0]] == signatures[pairs[:, 1]], axis=1) > args.threshold
+            ),
+        ),
+        "simhash": (
+            SimHasher(),
+            num_tables,
+            functools.partial(table_keys, num_blocks=args.num_blocks, max_distance=args.max_hamming_distance),
+            lambda signatures: lambda pairs: (
+                hamming_distance(signatures[pairs[:, 0], 0], signatures[pairs[:, 1], 0]) <= args.max_hamming_distance
+            ),
+        ),
+    }
+
+    print(f"\n{'engine':<10} {'docs/s':>10} {'bytes/doc':>10} {'recall':>8} {'precision':>10}")
+    for name, (hasher, num_bands, key_fn, make_match) in engines.items():
+        start = time.perf_counter()
+        signatures = np.stack([hasher.signature(ngrams) for ngrams in ngram_sets])
+        cluster_id = cluster(signatures, num_bands, key_fn, make_match(signatures))
+        elapsed = time.perf_counter() - start
+
+        found = {
+            (i, j) for i, j in itertools.combinations(range(len(corpus)), 2) if cluster_id[i] == cluster_id[j]
+        }
+        recall = len(found & true_pairs) / max(len(true_pairs), 1)
+        precision = len(found & true_pairs) / max(len(found), 1)
+        # the signature plus one (band hash, doc id) record per band or table
+        bytes_per_doc = signatures.shape[1] * signatures.itemsize + num_bands * BAND_RECORD.itemsize
+        print(f"{name:<10} {len(corpus) / elapsed:>10,.0f} {bytes_per_doc:>10} {recall:>8.3f} {precision:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
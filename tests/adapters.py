@@ -46,9 +46,9 @@ def run_gopher_quality_filter(text: str) -> bool:
 
 
 def run_exact_line_deduplication(
-    input_files: list[os.PathLike], output_directory: os.PathLike
+    input_files: list[os.PathLike], output_directory: os.PathLike, **kwargs
 ):
-    return exact_dedup(input_files, output_directory)
+    return exact_dedup(input_files, output_directory, **kwargs)
 
 
 def run_minhash_deduplication(
@@ -58,6 +58,7 @@ def run_minhash_deduplication(
     ngrams: int,
     jaccard_threshold: float,
     output_directory: os.PathLike,
+    **kwargs,
 ):
     return fuzzy_deduplicate(
         input_paths=input_files,
@@ -66,4 +67,5 @@ def run_minhash_deduplication(
         ngram_size=ngrams,
         jaccard_threshold=jaccard_threshold,
         output_dir=output_directory,
+        **kwargs,
     )
@@ -1,3 +1,12 @@
 import pathlib
 
+import numpy as np
+
+from cs336_data.substring_dedup import EOS_TOKEN_ID
+
 FIXTURES_PATH = (pathlib.Path(__file__).resolve().parent) / "fixtures"
+
+
+def write_tokens(path, documents):
+    """Write documents as a flat uint16 token file, each followed by EOS."""
+    np.concatenate([np.r_[doc, EOS_TOKEN_ID] for doc in documents]).astype(np.uint16).tofile(path)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from cs336_data import substring_dedup
+from cs336_data.contamination import check_contamination
+from cs336_data.substring_dedup import EOS_TOKEN_ID
+
+from .common import write_tokens
+
+
+@pytest.mark.parametrize("chunk_tokens", [1 << 24, 29])
+def test_check_contamination(tmp_path, monkeypatch, chunk_tokens):
+    monkeypatch.setattr(substring_dedup, "CHUNK_TOKENS", chunk_tokens)
+    rng = np.random.default_rng(0)
+    valid = [rng.integers(0, 50000, size=n) for n in (30, 40)]
+    unique = [rng.integers(0, 50000, size=n) for n in (25, 35, 20, 15)]
+    train = [
+        unique[0],
+        np.r_[unique[1], valid[0][5:18]],  # shares exactly one window
+        np.r_[valid[1][:12], unique[2]],  # shares 12 tokens, too short
+        np.r_[valid[0][-7:], valid[1][:6]],  # only across a validation document boundary
+        np.r_[unique[3], valid[1][10:35], unique[0]],
+        unique[2],
+    ]
+    train_path, valid_path, output_path = tmp_path / "train.bin", tmp_path / "valid.bin", tmp_path / "clean.bin"
+    write_tokens(train_path, train)
+    write_tokens(valid_path, valid)
+
+    stats = check_contamination(train_path, valid_path, ngram_size=13, output_path=output_path)
+
+    assert stats["contaminated_docs"] == 2 and stats["train_docs"] == 6
+    assert stats["matched_windows"] == 1 + 25 - 13 + 1
+    kept = [train[i] for i in (0, 2, 3, 5)]
+    output = np.fromfile(output_path, dtype=np.uint16)
+    np.testing.assert_array_equal(output, np.concatenate([np.r_[doc, EOS_TOKEN_ID] for doc in kept]))
+    assert np.load(f"{output_path}.removed.npy").tolist() == [1, 4]
@@ -0,0 +1,190 @@
+import time
+
+import numpy as np
+import pytest
+import torch
+
+from cs336_basics import data
+from cs336_basics.data import (
+    EOS_TOKEN_ID,
+    IGNORE_INDEX,
+    DocumentDataset,
+    MixtureDataset,
+    PrefetchingBatchLoader,
+    document_index,
+    get_batch,
+)
+
+
+EOS, PAD = EOS_TOKEN_ID, IGNORE_INDEX
+
+
+def _write_documents(path):
+    # documents at [0, 4, 15, 18, 23) and a last one without EOS
+    documents = [[1, 2, 3], list(range(4, 14)), [14, 15], [16, 17, 18, 19]]
+    np.array([t for doc in documents for t in [*doc, EOS]] + [20, 21], dtype=np.uint16).tofile(path)
+
+
+def _stacked_get_batch(dataset, batch_size, context_length):
+    # the per-row slicing get_batch replaced
+    starting_idxs = torch.randint(len(dataset) - context_length, (batch_size,))
+    x = torch.stack([torch.from_numpy(dataset[i : i + context_length].astype(np.int64)) for i in starting_idxs])
+    y = torch.stack([torch.from_numpy(dataset[i + 1 : i + 1 + context_length].astype(np.int64)) for i in starting_idxs])
+    return x, y
+
+
+def test_get_batch_matches_per_row_slicing():
+    dataset = np.arange(100, dtype=np.uint16)
+    torch.manual_seed(0)
+    x, y = get_batch(dataset, 64, 7, "cpu")
+    torch.manual_seed(0)
+    x_ref, y_ref = _stacked_get_batch(dataset, 64, 7)
+    assert torch.equal(x, x_ref) and torch.equal(y, y_ref)
+    assert x.dtype == torch.int64 and x.shape == (64, 7)
+    # every start in [0, len - context_length), and y is x shifted by one token
+    assert x[:, 0].min() >= 0 and x[:, 0].max() <= 100 - 7 - 1
+    assert torch.equal(y[:, :-1], x[:, 1:]) and torch.equal(y[:, -1], x[:, -1] + 1)
+
+
+def test_prefetching_loader_matches_get_batch():
+    dataset = np.arange(100, dtype=np.uint16)
+    torch.manual_seed(0)
+    expected = [get_batch(dataset, 4, 7, "cpu") for _ in range(5)]
+    with PrefetchingBatchLoader(dataset, 4, 7, "cpu", depth=2, seed=0) as loader:
+        for x_ref, y_ref in expected:
+            x, y = next(loader)
+            assert torch.equal(x, x_ref) and torch.equal(y, y_ref)
+
+
+def test_prefetching_loader_keeps_batch_for_two_calls():
+    dataset = np.arange(100, dtype=np.uint16)
+    torch.manual_seed(0)
+    expected = [get_batch(dataset, 4, 7, "cpu")[0] for _ in range(4)]
+    # depth 1: three buffers, taken in turn
+    with PrefetchingBatchLoader(dataset, 4, 7, "cpu", depth=1, seed=0) as loader:
+        x0, _ = next(loader)
+        next(loader)
+        time.sleep(0.1)  # the background thread refills every buffer it is given
+        assert torch.equal(x0, expected[0])
+        next(loader)
+        x3, _ = next(loader)
+        # two calls later the first buffer was recycled for the fourth batch
+        assert x3.data_ptr() == x0.data_ptr()
+        assert torch.equal(x3, expected[3])
+
+
+def test_prefetching_loader_reraises(monkeypatch):
+    def failing_sample_windows(*args):
+        raise ValueError("no windows")
+
+    monkeypatch.setattr(data, "sample_windows", failing_sample_windows)
+    with PrefetchingBatchLoader(np.arange(100, dtype=np.uint16), 4, 7, "cpu") as loader:
+        for _ in range(2):
+            with pytest.raises(ValueError, match="no windows"):
+                next(loader)
+
+
+def test_prefetching_loader_close():
+    loader = PrefetchingBatchLoader(np.arange(100, dtype=np.uint16), 4, 7, "cpu")
+    next(loader)
+    loader.close()
+    assert not loader._thread.is_alive()
+    with pytest.raises(StopIteration):
+        next(loader)
+
+
+def test_mixture_dataset(tmp_path):
+    # source a: two uint16 shards found by a glob, source b: one uint32 shard past the uint16 range
+    np.arange(0, 100, dtype=np.uint16).tofile(tmp_path / "a_0.bin")
+    np.arange(1000, 1030, dtype=np.uint16).tofile(tmp_path / "a_1.bin")
+    np.arange(100_000, 100_200, dtype=np.uint32).tofile(tmp_path / "b.bin")
+    dataset = MixtureDataset(
+        [tmp_path / "a_*.bin", tmp_path / "b.bin"], weights=[0.25, 0.75], dtypes=["uint16", "uint32"]
+    )
+    assert len(dataset.shards) == 3 and len(dataset) == 330
+
+    windows = dataset.sample(4000, 8, torch.Generator().manual_seed(0))
+    assert windows.shape == (4000, 8) and windows.dtype == np.int64
+    from_b = windows[:, 0] >= 100_000
+    assert abs(from_b.mean() - 0.75) < 0.03
+    # the shards' tokens are consecutive, so a window crossing a shard boundary would skip
+    assert (np.diff(windows, axis=1) == 1).all()
+    assert windows[~from_b, -1].max() <= 1029 and windows[from_b, -1].max() <= 100_199
+    assert {0, 92, 1000, 1022, 100_000, 100_192} <= set(windows[:, 0].tolist())
+
+
+def test_mixture_dataset_default_weights(tmp_path):
+    np.arange(0, 100, dtype=np.uint16).tofile(tmp_path / "a.bin")
+    np.arange(1000, 1300, dtype=np.uint16).tofile(tmp_path / "b.bin")
+    dataset = MixtureDataset([tmp_path / "a.bin", tmp_path / "b.bin"])
+    assert dataset.weights.tolist() == [0.25, 0.75]
+
+
+def test_mixture_dataset_short_source(tmp_path):
+    np.arange(0, 100, dtype=np.uint16).tofile(tmp_path / "a.bin")
+    np.arange(1000, 1010, dtype=np.uint16).tofile(tmp_path / "b.bin")
+    dataset = MixtureDataset([tmp_path / "a.bin", tmp_path / "b.bin"], weights=[0.5, 0.5])
+    assert dataset.sample(16, 10).shape == (16, 10)
+    with pytest.raises(ValueError, match="source 1 has no window of 11 tokens"):
+        dataset.sample(16, 11)
+
+
+def test_document_index(tmp_path):
+    path = tmp_path / "tokens.bin"
+    _write_documents(path)
+    assert document_index(path).tolist() == [0, 4, 15, 18, 23, 25]
+    # cached until the token file changes
+    assert (tmp_path / f"tokens.bin.docidx.uint16.eos{EOS}.npy").exists()
+    assert document_index(path).tolist() == [0, 4, 15, 18, 23, 25]
+
+
+def test_document_index_cache_per_eos_and_dtype(tmp_path):
+    path = tmp_path / "tokens.bin"
+    np.array([1, 7, 3, 2, 3, 7, 4], dtype=np.uint16).tofile(path)
+    for _ in range(2):
+        assert document_index(path, eos_token_id=7).tolist() == [0, 2, 6, 7]
+        assert document_index(path, eos_token_id=3).tolist() == [0, 3, 5, 7]
+        # the bytes 1 0 7 0 3 0 2 0 3 0 7 0 4 0
+        assert document_index(path, dtype=np.uint8, eos_token_id=7).tolist() == [0, 3, 11, 14]
+
+
+def test_document_dataset_doc_start(tmp_path):
+    path = tmp_path / "tokens.bin"
+    _write_documents(path)
+    dataset = DocumentDataset(path, mode="doc_start")
+    assert dataset.num_documents == 5
+    windows = dataset.sample(200, 8, torch.Generator().manual_seed(0))
+    # only the documents that leave room for a whole window
+    assert {tuple(row) for row in windows.tolist()} == {
+        (1, 2, 3, EOS, 4, 5, 6, 7),
+        (4, 5, 6, 7, 8, 9, 10, 11),
+        (14, 15, EOS, 16, 17, 18, 19, EOS),
+    }
+
+
+def test_document_dataset_packed(tmp_path):
+    path = tmp_path / "tokens.bin"
+    _write_documents(path)
+    dataset = DocumentDataset(path, mode="packed")
+    windows = dataset.sample(200, 8, torch.Generator().manual_seed(0))
+    # whole documents, padded; a first document longer than the window is truncated
+    assert {tuple(row) for row in windows.tolist()} == {
+        (1, 2, 3, EOS, PAD, PAD, PAD, PAD),
+        (4, 5, 6, 7, 8, 9, 10, 11),
+        (14, 15, EOS, 16, 17, 18, 19, EOS),
+    }
+    with pytest.raises(ValueError):
+        dataset.sample(4, 26)
+
+
+def test_packed_batches_feed_padding_as_eos(tmp_path):
+    path = tmp_path / "tokens.bin"
+    _write_documents(path)
+    dataset = DocumentDataset(path, mode="packed")
+    torch.manual_seed(0)
+    x, y = get_batch(dataset, 200, 7, "cpu")
+    assert not (x == PAD).any()
+    rows = x[:, 0] == 1
+    assert rows.any()
+    assert (x[rows] == torch.tensor([1, 2, 3, EOS, EOS, EOS, EOS])).all()
+    assert (y[rows] == torch.tensor([2, 3, EOS, PAD, PAD, PAD, PAD])).all()
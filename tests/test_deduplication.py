@@ -1,7 +1,16 @@
+import functools
+import json
 import logging
 
+import numpy as np
+import pytest
 from xopen import xopen
 
+from cs336_data import dedup, lsh, simhash
+from cs336_data.bloom import BloomFilter
+from cs336_data.dedup import normalize_text, word_ngrams
+from cs336_data.minhash import hash_word_ngrams
+
 from .adapters import run_exact_line_deduplication, run_minhash_deduplication
 from .common import FIXTURES_PATH
 
@@ -40,6 +49,155 @@ def test_exact_line_deduplication(tmp_path):
     assert len(deduplicated_documents) == 0
 
 
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"memory_limit": 1},
+        {"memory_limit": 1 << 30, "num_workers": 2},
+        {"num_workers": 3},
+    ],
+)
+def test_exact_line_deduplication_partitioned(tmp_path, options):
+    """
+    Spilling line hashes to on-disk partitions, serially or in parallel, must
+    give the same output as the in-memory path.
+    """
+    input_paths = sorted((FIXTURES_PATH / "documents_with_line_duplicates").glob("doc*.txt"))
+    in_memory_dir = tmp_path / "in_memory"
+    spilled_dir = tmp_path / "spilled"
+    in_memory_dir.mkdir()
+    spilled_dir.mkdir()
+
+    in_memory_report = run_exact_line_deduplication(input_files=input_paths, output_directory=in_memory_dir)
+    spilled_report = run_exact_line_deduplication(
+        input_files=input_paths, output_directory=spilled_dir, tmp_dir=tmp_path, **options
+    )
+    for path in input_paths:
+        assert (spilled_dir / path.name).read_text() == (in_memory_dir / path.name).read_text()
+    assert in_memory_report.pop("seconds").keys() == spilled_report.pop("seconds").keys() == {"count", "write", "total"}
+    assert in_memory_report == spilled_report
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["in_memory", "spilled"]
+
+
+@pytest.mark.parametrize("options", [{}, {"num_workers": 2}])
+def test_exact_line_deduplication_hash_store(tmp_path, options):
+    """
+    Lines recorded in the hash store by an earlier crawl are removed from a
+    new crawl, and the new crawl's lines are added to the store.
+    """
+    store = tmp_path / "store"
+    for crawl, lines in enumerate([["a", "b", "b", "c"], ["c", "d", "e", "e"], ["a", "d", "f"]]):
+        (tmp_path / f"crawl{crawl}").mkdir()
+        (tmp_path / f"out{crawl}").mkdir()
+        (tmp_path / f"crawl{crawl}" / "shard.txt").write_text("".join(line + "\n" for line in lines))
+        run_exact_line_deduplication(
+            input_files=[tmp_path / f"crawl{crawl}" / "shard.txt"],
+            output_directory=tmp_path / f"out{crawl}",
+            hash_store=store,
+            tmp_dir=tmp_path,
+            **options,
+        )
+    assert (tmp_path / "out0" / "shard.txt").read_text() == "a\nc\n"
+    assert (tmp_path / "out1" / "shard.txt").read_text() == "d\n"
+    assert (tmp_path / "out2" / "shard.txt").read_text() == "f\n"
+
+
+@pytest.mark.parametrize("extension", [".gz", ".zst"])
+@pytest.mark.parametrize("options", [{}, {"num_workers": 2}])
+def test_exact_line_deduplication_compressed(tmp_path, extension, options):
+    """Compressed shards are deduplicated like their decompressed contents and written with the same codec."""
+    input_paths = sorted((FIXTURES_PATH / "documents_with_line_duplicates").glob("doc*.txt"))
+    (tmp_path / "compressed").mkdir()
+    for path in input_paths:
+        with xopen(tmp_path / "compressed" / (path.name + extension), "w") as f:
+            f.write(path.read_text())
+    run_exact_line_deduplication(input_files=input_paths, output_directory=tmp_path)
+    (tmp_path / "out").mkdir()
+    run_exact_line_deduplication(
+        input_files=sorted((tmp_path / "compressed").iterdir()), output_directory=tmp_path / "out", **options
+    )
+    for path in input_paths:
+        with xopen(tmp_path / "out" / (path.name + extension)) as f:
+            assert f.read() == (tmp_path / path.name).read_text()
+
+
+def test_deduplication_reports(tmp_path):
+    input_paths, _ = _write_fuzzy_duplicate_shards(tmp_path / "shards", "line")
+    report = run_minhash_deduplication(
+        input_files=input_paths,
+        output_directory=tmp_path / "fuzzy",
+        num_hashes=500,
+        num_bands=50,
+        ngrams=5,
+        jaccard_threshold=0.8,
+        doc_mode="line",
+        report_path=tmp_path / "fuzzy.json",
+    )
+    assert json.loads((tmp_path / "fuzzy.json").read_text()) == report
+    assert (report["input_docs"], report["output_docs"], report["duplicate_docs"]) == (6, 5, 1)
+    # four singletons and the pair of MIT licenses
+    assert report["cluster_size_histogram"] == [4, 1]
+    assert report["pairs_matched"] == 1 and report["pairs_checked"] >= 1
+    assert report["output_bytes"] < report["input_bytes"]
+    assert {"read", "normalize", "signature", "banding", "verify", "write", "total"} <= report["seconds"].keys()
+
+    # without any candidate pair the report has the same counts and stages, at zero
+    (tmp_path / "distinct").mkdir()
+    (tmp_path / "distinct" / "shard.txt").write_text("one two three four five six\nseven eight nine ten eleven\n")
+    distinct_report = run_minhash_deduplication(
+        input_files=[tmp_path / "distinct" / "shard.txt"],
+        output_directory=tmp_path / "distinct_output",
+        num_hashes=500,
+        num_bands=50,
+        ngrams=5,
+        jaccard_threshold=0.8,
+        doc_mode="line",
+    )
+    assert distinct_report.keys() == report.keys()
+    assert distinct_report["seconds"].keys() == report["seconds"].keys()
+    assert distinct_report["pairs_checked"] == distinct_report["pairs_matched"] == 0
+    assert distinct_report["pairs_generated"] == 0
+
+    (tmp_path / "exact").mkdir()
+    report = run_exact_line_deduplication(
+        input_files=input_paths + input_paths[:1],
+        output_directory=tmp_path / "exact",
+        report_path=tmp_path / "exact.json",
+    )
+    assert json.loads((tmp_path / "exact.json").read_text()) == report
+    assert (report["input_lines"], report["output_lines"], report["duplicate_ratio"]) == (9, 3, 6 / 9)
+
+
+def test_bloom_dedup(tmp_path):
+    """The first occurrence of every line is kept, across files and within a batch."""
+    (tmp_path / "in").mkdir()
+    (tmp_path / "out").mkdir()
+    shards = [["a", "b", "a", "c", "b", "d"], ["d", "e", "a", "f", "f"]]
+    for i, lines in enumerate(shards):
+        (tmp_path / "in" / f"shard{i}.txt").write_text("".join(line + "\n" for line in lines))
+
+    stats = dedup.bloom_dedup(
+        [tmp_path / "in" / f"shard{i}.txt" for i in range(2)], tmp_path / "out", expected_lines=100
+    )
+
+    assert (tmp_path / "out" / "shard0.txt").read_text() == "a\nb\nc\nd\n"
+    assert (tmp_path / "out" / "shard1.txt").read_text() == "e\nf\n"
+    assert stats["lines"] == 11 and stats["kept_lines"] == 6
+    assert 0 < stats["estimated_fp_rate"] < 1e-3
+
+
+def test_bloom_filter_false_positive_rate():
+    rng = np.random.default_rng(0)
+    keys = rng.integers(0, 2**63, size=100_000, dtype=np.uint64)
+    others = rng.integers(0, 2**63, size=100_000, dtype=np.uint64)
+    seen = BloomFilter(len(keys), fp_rate=0.01)
+    seen.add(keys)
+    assert seen.contains(keys).all()
+    assert 0.005 < seen.contains(others).mean() < 0.015
+    assert 0.005 < seen.estimated_fp_rate() < 0.015
+    assert seen.nbytes < 1.25 * len(keys)
+
+
 def test_minhash_deduplication_exact_duplicates(tmp_path):
     """
     Check that minhash deduplication properly identifies and removes exact duplicates.
@@ -130,3 +288,346 @@ def test_minhash_deduplication_fuzzy_duplicates(tmp_path):
     assert len(deduplicated_documents) == 0
     # One of the kept deduplicated documents should be kept, and the other should be removed.
     assert len(kept_duplicated_documents) == 1
+
+
+def _write_fuzzy_duplicate_shards(shard_dir, doc_mode, extension=""):
+    """Two shards with one document per line, the MIT licenses are fuzzy duplicates across shards."""
+    docs = {
+        path.name: " ".join(path.read_text().split())
+        for path in (FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt")
+    }
+    shards = {
+        "shard0.txt": ["the only line of a unique document", docs["rails_mit_license.txt"], ""],
+        "shard1.txt": [docs["pytorch_license.txt"], docs["react_mit_license.txt"], "a"],
+    }
+    shard_dir.mkdir()
+    for name, lines in shards.items():
+        if doc_mode == "jsonl":
+            lines = [json.dumps({"id": i, "text": line}) for i, line in enumerate(lines)]
+        with xopen(shard_dir / (name + extension), "w") as f:
+            f.write("".join(line + "\n" for line in lines))
+    return sorted(shard_dir.glob(f"*.txt{extension}")), docs
+
+
+@pytest.mark.parametrize("doc_mode, extension", [("line", ""), ("jsonl", ""), ("jsonl", ".gz")])
+def test_minhash_deduplication_documents_per_line(tmp_path, doc_mode, extension):
+    input_paths, docs = _write_fuzzy_duplicate_shards(tmp_path / "shards", doc_mode, extension)
+    output_dir = tmp_path / "output"
+    run_minhash_deduplication(
+        input_files=input_paths,
+        output_directory=output_dir,
+        num_hashes=500,
+        num_bands=50,
+        ngrams=5,
+        jaccard_threshold=0.8,
+        doc_mode=doc_mode,
+    )
+    kept = {}
+    for path in input_paths:
+        with xopen(output_dir / path.name) as f:
+            lines = f.read().splitlines()
+        if doc_mode == "jsonl":
+            lines = [json.loads(line)["text"] for line in lines]
+        kept[path.name.removesuffix(extension)] = lines
+
+    # documents too short to have a 5-gram are never duplicates
+    assert kept["shard0.txt"][0] == "the only line of a unique document"
+    assert "" in kept["shard0.txt"] and "a" in kept["shard1.txt"]
+    assert docs["pytorch_license.txt"] in kept["shard1.txt"]
+    mit_licenses = [docs["rails_mit_license.txt"], docs["react_mit_license.txt"]]
+    assert sum(text in mit_licenses for texts in kept.values() for text in texts) == 1
+    assert sum(len(texts) for texts in kept.values()) == 5
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"memory_limit": 1}, {"num_workers": 2}])
+def test_minhash_deduplication_reads_compressed_shards_once(tmp_path, monkeypatch, kwargs):
+    monkeypatch.setattr(dedup, "CHUNK_DOCS", 2)
+    compressed_paths, docs = _write_fuzzy_duplicate_shards(tmp_path / "compressed", "line", ".gz")
+    plain_paths, _ = _write_fuzzy_duplicate_shards(tmp_path / "plain", "line")
+    opened = []
+    open_shard = dedup._open
+    monkeypatch.setattr(dedup, "_open", lambda path, *args, **kw: opened.append(path) or open_shard(path, *args, **kw))
+    input_paths = [compressed_paths[0], plain_paths[1]]
+    stats = run_minhash_deduplication(
+        input_files=input_paths,
+        output_directory=tmp_path / "output",
+        num_hashes=500,
+        num_bands=50,
+        ngrams=5,
+        jaccard_threshold=0.8,
+        doc_mode="line",
+        exact_jaccard=True,
+        **kwargs,
+    )
+    kept = {}
+    for path in input_paths:
+        with xopen(tmp_path / "output" / path.name) as f:
+            kept[path.name] = f.read().splitlines()
+    assert kept == {
+        "shard0.txt.gz": ["the only line of a unique document", docs["rails_mit_license.txt"], ""],
+        "shard1.txt": [docs["pytorch_license.txt"], "a"],
+    }
+    assert stats["input_docs"] == 6
+    if "num_workers" not in kwargs:
+        # signed in one pass and rewritten in another
+        assert opened.count(compressed_paths[0]) == 2
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"num_workers": 2}, {"memory_limit": 1}, {"memory_limit": 1 << 30, "num_workers": 2}],
+)
+def test_minhash_deduplication_out_of_core(tmp_path, monkeypatch, kwargs):
+    # small chunks so that every shard is split across several signature and banding tasks
+    monkeypatch.setattr(dedup, "CHUNK_DOCS", 2)
+    monkeypatch.setattr(lsh, "SPILL_ROWS", 2)
+    input_paths, _ = _write_fuzzy_duplicate_shards(tmp_path / "shards", "line")
+    outputs = {}
+    for name, extra_kwargs in [("in_memory", {}), ("out_of_core", kwargs)]:
+        run_minhash_deduplication(
+            input_files=input_paths,
+            output_directory=tmp_path / name,
+            num_hashes=500,
+            num_bands=50,
+            ngrams=5,
+            jaccard_threshold=0.8,
+            doc_mode="line",
+            tmp_dir=tmp_path,
+            **extra_kwargs,
+        )
+        outputs[name] = {path.name: (tmp_path / name / path.name).read_text() for path in input_paths}
+    assert outputs["in_memory"] == outputs["out_of_core"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["in_memory", "out_of_core", "shards"]
+
+    # an empty corpus: no shards, or only empty ones
+    (tmp_path / "empty.txt").touch()
+    for empty_paths in ([], [tmp_path / "empty.txt"]):
+        stats = run_minhash_deduplication(
+            input_files=empty_paths,
+            output_directory=tmp_path / "empty",
+            num_hashes=500,
+            num_bands=50,
+            ngrams=5,
+            jaccard_threshold=0.8,
+            doc_mode="line",
+            tmp_dir=tmp_path,
+            **kwargs,
+        )
+        assert stats["input_docs"] == 0 and stats["output_docs"] == 0
+    assert (tmp_path / "empty" / "empty.txt").read_text() == ""
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_minhash_deduplication_exact_jaccard(tmp_path, num_workers):
+    input_paths, docs = _write_fuzzy_duplicate_shards(tmp_path / "shards", "line")
+    # the MIT licenses have a 5-gram Jaccard similarity of 0.919
+    kept = {}
+    for threshold in (0.9, 0.92):
+        output_dir = tmp_path / str(threshold)
+        stats = run_minhash_deduplication(
+            input_files=input_paths,
+            output_directory=output_dir,
+            num_hashes=20,
+            num_bands=10,
+            ngrams=5,
+            jaccard_threshold=threshold,
+            doc_mode="line",
+            num_workers=num_workers,
+            exact_jaccard=True,
+        )
+        assert stats["pairs_checked"] >= 1
+        kept[threshold] = [line for path in input_paths for line in (output_dir / path.name).read_text().splitlines()]
+    mit_licenses = [docs["rails_mit_license.txt"], docs["react_mit_license.txt"]]
+    assert sum(text in mit_licenses for text in kept[0.9]) == 1
+    assert sum(text in mit_licenses for text in kept[0.92]) == 2
+
+
+def test_minhash_lsh_index_save_load(tmp_path):
+    rng = np.random.default_rng(0)
+    signatures = rng.integers(0, 1 << 31, size=(100, 16), dtype=np.uint32)
+    index = lsh.MinHashLSHIndex(num_hashes=16, num_bands=4)
+    index.insert_batch(np.arange(100, 199), signatures[:-1])
+    index.insert(7, signatures[-1])
+    near = signatures[:3].copy()
+    near[:, :4] += 1  # one band differs, three still match
+    for _ in range(2):
+        assert [ids.tolist() for ids in index.query_batch(near)] == [[100], [101], [102]]
+        assert [ids.tolist() for ids in index.query_batch(near, threshold=0.8)] == [[], [], []]
+        assert index.query(signatures[-1]).tolist() == [7]
+        index.save(tmp_path / "index")
+        index = lsh.MinHashLSHIndex.load(tmp_path / "index")
+    assert len(index) == 100
+
+
+def test_minhash_lsh_index_saves_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr(lsh.MinHashLSHIndex, "merge_chunk", 7)
+    rng = np.random.default_rng(0)
+    # few distinct values so that band keys repeat across the two levels
+    signatures = rng.integers(0, 2, size=(150, 16), dtype=np.uint32)
+    index = lsh.MinHashLSHIndex(num_hashes=16, num_bands=4)
+    index.insert_batch(np.arange(100), signatures[:100])
+    index.save(tmp_path / "index")
+    index = lsh.MinHashLSHIndex.load(tmp_path / "index")
+    index.insert_batch(np.arange(100, 150), signatures[100:])
+    # stored and new rows answer queries alike
+    expected = [np.flatnonzero((signatures == signature).all(axis=1)).tolist() for signature in signatures[[0, 120]]]
+    assert [ids.tolist() for ids in index.query_batch(signatures[[0, 120]], threshold=0.99)] == expected
+    index.save(tmp_path / "index")
+    assert (tmp_path / "index" / "doc_ids.bin").stat().st_size == 150 * 8
+
+    index = lsh.MinHashLSHIndex.load(tmp_path / "index")
+    assert len(index.pending_keys) == 0 and index.doc_ids.tolist() == list(range(150))
+    keys = lsh.band_hashes(signatures, 4).ravel()
+    order = np.argsort(keys, kind="stable")
+    np.testing.assert_array_equal(index.band_keys, keys[order])
+    np.testing.assert_array_equal(index.band_rows, order // 4)
+    assert [ids.tolist() for ids in index.query_batch(signatures[[0, 120]], threshold=0.99)] == expected
+
+
+def test_minhash_deduplication_against_index(tmp_path):
+    input_paths, docs = _write_fuzzy_duplicate_shards(tmp_path / "shards", "line")
+    kept = []
+    for crawl, input_path in enumerate(input_paths):
+        # the second crawl brings the react MIT license, a near duplicate of rails' from the first one
+        output_dir = tmp_path / f"crawl{crawl}"
+        stats = run_minhash_deduplication(
+            input_files=[input_path],
+            output_directory=output_dir,
+            num_hashes=500,
+            num_bands=50,
+            ngrams=5,
+            jaccard_threshold=0.8,
+            doc_mode="line",
+            index_path=tmp_path / "index",
+        )
+        kept.append((output_dir / input_path.name).read_text().splitlines())
+    assert stats["index_matches"] == 1
+    assert docs["rails_mit_license.txt"] in kept[0]
+    assert kept[1] == [docs["pytorch_license.txt"], "a"]
+
+
+def test_candidate_pairs_match_all_pairs_sharing_a_band():
+    rng = np.random.default_rng(0)
+    # few distinct values so that many documents share bands
+    signatures = rng.integers(0, 3, size=(200, 8), dtype=np.uint32)
+    has_ngrams = rng.random(200) < 0.9
+    stats = {}
+    pairs = np.concatenate(list(lsh.iter_candidate_pairs(signatures, has_ngrams, num_bands=4, stats=stats)))
+    expected = {
+        (i, j)
+        for b in range(4)
+        for i in np.flatnonzero(has_ngrams)
+        for j in np.flatnonzero(has_ngrams)
+        if i < j and (signatures[i, 2 * b:2 * b + 2] == signatures[j, 2 * b:2 * b + 2]).all()
+    }
+    assert sorted(map(tuple, pairs.tolist())) == sorted(expected)
+    assert stats["pairs_unique"] == len(expected) < stats["pairs_generated"]
+    assert sum(stats["bucket_size_histogram"]) == stats["buckets"]
+
+
+@pytest.mark.parametrize("max_pairs", [1, 40, None])
+def test_bucket_pairs_in_batches(max_pairs):
+    rng = np.random.default_rng(0)
+    signatures = rng.integers(0, 3, size=(200, 8), dtype=np.uint32)
+    records = lsh.band_records(signatures, 4, np.ones(200, dtype=bool))
+    pairs, stats = lsh.bucket_pairs(records, max_bucket_size=30)
+    batches, batch_stats = lsh.iter_bucket_pairs(records, max_bucket_size=30, max_pairs=max_pairs)
+    assert batch_stats["pairs_generated"] == stats["pairs_generated"] == len(pairs)
+    batches = list(batches)
+    np.testing.assert_array_equal(lsh.unique_pairs(np.concatenate(batches)), lsh.unique_pairs(pairs))
+    if max_pairs is not None:
+        # a batch only exceeds max_pairs when it is one bucket
+        assert all(len(batch) <= max(max_pairs, 30 * 29 // 2) for batch in batches)
+        assert len(batches) > 1
+
+def test_giant_buckets_link_to_leader():
+    signatures = np.zeros((50, 8), dtype=np.uint32)
+    stats = {}
+    pairs = np.concatenate(list(lsh.iter_candidate_pairs(
+        signatures, np.ones(50, dtype=bool), num_bands=4, max_bucket_size=10, stats=stats
+    )))
+    assert pairs.tolist() == [[0, j] for j in range(1, 50)]
+    assert stats["giant_buckets"] == 4
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"num_workers": 2}])
+def test_simhash_deduplication(tmp_path, kwargs):
+    input_paths, docs = _write_fuzzy_duplicate_shards(tmp_path / "shards", "line")
+    output_dir = tmp_path / "output"
+    run_minhash_deduplication(
+        input_files=input_paths,
+        output_directory=output_dir,
+        num_hashes=500,
+        num_bands=50,
+        ngrams=5,
+        jaccard_threshold=0.8,
+        doc_mode="line",
+        engine="simhash",
+        **kwargs,
+    )
+    kept = [line for path in input_paths for line in (output_dir / path.name).read_text().splitlines()]
+    assert kept == [
+        "the only line of a unique document",
+        docs["rails_mit_license.txt"],
+        "",
+        docs["pytorch_license.txt"],
+        "a",
+    ]
+
+
+def test_simhash_tables_find_all_close_fingerprints():
+    rng = np.random.default_rng(0)
+    fingerprints = rng.integers(0, 1 << 63, size=100, dtype=np.uint64)
+    # near copies with 1 to 4 flipped bits
+    flips = [
+        np.bitwise_or.reduce(np.uint64(1) << rng.choice(64, size=k, replace=False).astype(np.uint64))
+        for k in [1, 2, 3, 4] * 25
+    ]
+    fingerprints = np.concatenate([fingerprints, fingerprints ^ np.array(flips, dtype=np.uint64)])
+    key_fn = functools.partial(simhash.table_keys, num_blocks=6, max_distance=3)
+    candidates = lsh.iter_candidate_pairs(fingerprints[:, None], np.ones(200, dtype=bool), 20, key_fn=key_fn)
+    pairs = np.concatenate(list(candidates))
+    close = pairs[simhash.hamming_distance(fingerprints[pairs[:, 0]], fingerprints[pairs[:, 1]]) <= 3]
+    expected = [
+        (i, j) for i in range(200) for j in range(i + 1, 200)
+        if bin(int(fingerprints[i]) ^ int(fingerprints[j])).count("1") <= 3
+    ]
+    assert len(expected) >= 75
+    assert sorted(map(tuple, close.tolist())) == expected
+
+
+def test_connected_components():
+    rng = np.random.default_rng(0)
+    edges = rng.integers(0, 300, size=(200, 2))
+    cluster_id = lsh.connected_components(300, edges)
+    # reference: relabel to the smaller label along every edge until nothing changes
+    expected = np.arange(300)
+    changed = True
+    while changed:
+        changed = False
+        for a, b in edges:
+            low = min(expected[a], expected[b])
+            if expected[a] != low or expected[b] != low:
+                expected[expected == expected[a]] = low
+                expected[expected == expected[b]] = low
+                changed = True
+    assert cluster_id.tolist() == expected.tolist()
+
+
+def test_cluster_representatives():
+    cluster_id = np.array([0, 0, 2, 0, 2, 5])
+    assert np.flatnonzero(lsh.cluster_representatives(cluster_id)).tolist() == [0, 2, 5]
+    lengths = np.array([3, 7, 1, 7, 4, 0])
+    assert np.flatnonzero(lsh.cluster_representatives(cluster_id, lengths)).tolist() == [1, 4, 5]
+
+
+def test_normalize_text_strips_accents():
+    assert normalize_text("Crème Brûlée, naïve CAFÉ!") == "creme brulee naive cafe"
+
+
+def test_hashed_ngrams_match_string_ngrams():
+    for path in (FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"):
+        text = normalize_text(path.read_text())
+        hashes = hash_word_ngrams(text, 5)
+        assert len(hashes) == len(word_ngrams(text, 5))
+        assert len(hash_word_ngrams(text, 5, unique=False)) == len(text.split()) - 4
+    assert len(hash_word_ngrams("too short", 5)) == 0
@@ -0,0 +1,44 @@
+import concurrent.futures
+import multiprocessing
+
+from cs336_data import profiling
+from cs336_data.extract import gopher_quality_filter, mask_email
+
+
+def test_timed_records_only_when_enabled(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "_enabled", False)
+    profiling.reset_timings()
+    mask_email("reach me at someone@example.com")
+    assert profiling.get_timings() == {}
+
+    monkeypatch.setenv(profiling.ENV_DIR, str(tmp_path))
+    monkeypatch.setattr(profiling, "_enabled", True)
+    mask_email("reach me at someone@example.com")
+    mask_email("no address here")
+    timings = profiling.get_timings()
+    calls, seconds = timings["cs336_data.extract.mask_email"]
+    assert calls == 2
+    assert seconds >= 0
+    profiling.reset_timings()
+
+
+def test_collect_merges_pool_workers(monkeypatch, tmp_path):
+    monkeypatch.setenv(profiling.ENV_ENABLE, "1")
+    monkeypatch.setenv(profiling.ENV_SAMPLE_RATE, "1.0")
+    monkeypatch.setenv(profiling.ENV_DIR, str(tmp_path))
+    monkeypatch.setattr(profiling, "_enabled", True)
+    profiling.enable(profile_dir=str(tmp_path))
+    profiling.reset_timings()
+
+    text = "This should definitely be a valid input text. " * 20
+    context = multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=2, mp_context=context, initializer=profiling.worker_init
+    ) as executor:
+        results = list(executor.map(gopher_quality_filter, [text] * 8))
+    assert all(results)
+
+    timings = profiling.collect(str(tmp_path))
+    assert timings["cs336_data.extract.gopher_quality_filter"][0] == 8
+    assert (tmp_path / "merged.prof").exists()
+    profiling.reset_timings()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from cs336_data import hashing, substring_dedup
+from cs336_data.substring_dedup import EOS_TOKEN_ID, substring_deduplicate
+
+from .common import write_tokens
+
+
+@pytest.mark.parametrize("chunk_tokens, memory_limit", [(1 << 24, 1 << 30), (37, 1 << 12)])
+def test_substring_deduplicate(tmp_path, monkeypatch, chunk_tokens, memory_limit):
+    monkeypatch.setattr(substring_dedup, "CHUNK_TOKENS", chunk_tokens)
+    rng = np.random.default_rng(0)
+    boilerplate = rng.integers(0, 1000, size=60)
+    unique = [rng.integers(1000, 50000, size=n) for n in (20, 30, 40, 45, 10)]
+    documents = [
+        np.r_[unique[0], boilerplate, unique[1]],
+        np.r_[unique[2], boilerplate[:55]],
+        boilerplate[10:],  # nothing left but EOS, dropped
+        np.r_[unique[3], unique[4]],
+        np.r_[unique[3][:39], unique[4]],  # repeats shorter than min_length are kept
+        unique[3][5:],  # a repeat of exactly min_length tokens
+    ]
+    input_path, output_path = tmp_path / "tokens.bin", tmp_path / "dedup.bin"
+    write_tokens(input_path, documents)
+
+    stats = substring_deduplicate(input_path, output_path, min_length=40, memory_limit=memory_limit)
+
+    expected = [documents[0], unique[2], documents[3], documents[4]]
+    output = np.fromfile(output_path, dtype=np.uint16)
+    np.testing.assert_array_equal(output, np.concatenate([np.r_[doc, EOS_TOKEN_ID] for doc in expected]))
+    docs = np.load(f"{output_path}.docs.npz")
+    assert docs["offsets"].tolist() == np.cumsum([0] + [len(doc) + 1 for doc in expected]).tolist()
+    assert docs["source_docs"].tolist() == [0, 1, 3, 4]
+    assert stats["input_docs"] == 6 and stats["output_docs"] == 4
+
+
+@pytest.mark.parametrize("max_windows", [1, 5, None])
+def test_repeated_window_starts_batches(max_windows):
+    rng = np.random.default_rng(0)
+    span = rng.integers(0, 100, size=12)
+    tokens = np.r_[span, rng.integers(100, 200, size=30), span, span[:8], span, rng.integers(200, 300, size=5)]
+    tokens = tokens.astype(np.uint16)
+    positions, hashes = substring_dedup.document_windows(tokens, 10, EOS_TOKEN_ID)
+    records = np.empty(len(positions), dtype=substring_dedup.WINDOW_RECORD)
+    records["hash"], records["position"] = hashes, positions
+    starts = substring_dedup.repeated_window_starts(tokens, records, 10, max_windows)
+    assert starts.tolist() == [42, 43, 44, 62, 63, 64]
+
+
+def test_long_window_rolling_hash(monkeypatch):
+    tokens = np.random.default_rng(0).integers(0, 1 << 16, size=1000).astype(np.uint16)
+    prefix_hashes = hashing.rolling_hash(tokens, 50)
+    monkeypatch.setattr(hashing, "PREFIX_HASH_MIN_N", 1 << 30)
+    np.testing.assert_array_equal(prefix_hashes, hashing.rolling_hash(tokens, 50))